@@ -0,0 +1,95 @@
+# benchmarks/bench_codec.py
+# Per-message JSON cost of the MCP hot path, before and after the codec layer.
+#
+#   before: json.loads(frame) -> ... -> response.json() on the upstream body
+#           -> websocket.send_json (stdlib json.dumps)
+#   after:  codec.loads(frame) -> ... -> codec.loads(response.content) -> codec.dumps_text
+#
+# Usage: python benchmarks/bench_codec.py [--records N] [--iterations N]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import get_codec  # noqa: E402
+
+
+def make_incident(index: int) -> dict:
+    """A record shaped like a full incident from the Table API (~4 KB)."""
+    record = {
+        "sys_id": f"{index:032x}",
+        "number": f"INC{index:07d}",
+        "short_description": "Email server not responding for users in building 4",
+        "description": "Users report Outlook disconnects every few minutes. " * 20,
+        "state": "2",
+        "priority": "3",
+        "impact": "2",
+        "urgency": "2",
+        "caller_id": {"link": "https://example.service-now.com/api/now/table/sys_user/abc", "value": "abc"},
+        "assignment_group": {"link": "https://example.service-now.com/api/now/table/sys_user_group/def", "value": "def"},
+        "work_notes": "Checked exchange logs; restarted transport service. Ünïcödé note.",
+        "sys_created_on": "2024-01-01 10:00:00",
+        "sys_updated_on": "2024-01-01 12:00:00",
+    }
+    for field in range(60):
+        record[f"u_custom_field_{field}"] = f"value {field}"
+    return record
+
+
+def bench(fn, iterations: int) -> float:
+    """Mean microseconds per call of `fn`."""
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-message JSON encode/decode cost.")
+    parser.add_argument("--records", type=int, default=20, help="Incidents per tool result")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    frame = json.dumps({
+        "id": "msg-1",
+        "type": "execute",
+        "tool_name": "get_incidents_batch",
+        "params": {"numbers": [f"INC{i:07d}" for i in range(args.records)]},
+    })
+    records = [make_incident(i) for i in range(args.records)]
+    upstream_body = json.dumps({"result": records}).encode("utf-8")
+    tool_result = {"id": "msg-1", "type": "tool_result", "result": {"result": records}}
+
+    def stdlib_path():
+        json.loads(frame)
+        json.loads(upstream_body.decode("utf-8"))  # What response.json() does
+        json.dumps(tool_result, separators=(",", ":"), ensure_ascii=False)  # What send_json does
+
+    rows = [("stdlib (before)", stdlib_path)]
+    for name in ("json", "orjson"):
+        try:
+            codec = get_codec(name)
+        except ValueError:
+            continue
+
+        def codec_path(codec=codec):
+            codec.loads(frame)
+            codec.loads(upstream_body)
+            codec.dumps_text(tool_result)
+
+        rows.append((f"codec={name} (after)", codec_path))
+
+    print(f"{args.records} records/message, {len(upstream_body) / 1024:.1f} KB upstream body, {args.iterations} iterations")
+    baseline = None
+    for label, fn in rows:
+        us = bench(fn, args.iterations)
+        baseline = baseline or us
+        print(f"  {label:<22} {us:10.1f} us/message  {baseline / us:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
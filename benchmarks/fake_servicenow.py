@@ -0,0 +1,172 @@
+# benchmarks/fake_servicenow.py
+# Stand-in for the ServiceNow Table API used by the load tests: serves incident GET/POST
+# from memory with a configurable latency distribution and record size.
+#
+# Standalone: python benchmarks/fake_servicenow.py --port 8765 --latency-ms 50 --latency-dist lognormal
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import codec  # noqa: E402
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class LatencyModel:
+    """
+    Samples per-request upstream latency in seconds.
+    fixed: always `median_ms`. uniform: median_ms +/- spread. exponential: mean median_ms.
+    lognormal: median `median_ms` with shape `spread` (0.5 gives a p99 of ~3.2x the median).
+    """
+
+    def __init__(self, dist: str = "lognormal", median_ms: float = 50.0, spread: float = 0.5, seed: int = None):
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: '{dist}'")
+        self.dist = dist
+        self.median_s = median_ms / 1000.0
+        self.spread = spread
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.dist == "fixed" or self.median_s <= 0:
+            return self.median_s
+        if self.dist == "uniform":
+            return max(self._random.uniform(self.median_s * (1 - self.spread), self.median_s * (1 + self.spread)), 0.0)
+        if self.dist == "exponential":
+            return self._random.expovariate(1 / self.median_s)
+        return self._random.lognormvariate(0.0, self.spread) * self.median_s
+
+
+def make_incident(index: int, payload_bytes: int) -> dict:
+    """An incident record padded to roughly `payload_bytes` of JSON."""
+    record = {
+        "sys_id": uuid.uuid5(uuid.NAMESPACE_URL, f"incident/{index}").hex,
+        "number": f"INC{index:07d}",
+        "short_description": f"Benchmark incident {index}",
+        "state": "1",
+        "priority": "3",
+        "impact": "2",
+        "urgency": "2",
+        "sys_created_on": "2024-01-01 00:00:00",
+    }
+    record["description"] = "x" * max(payload_bytes - len(codec.dumps(record)), 0)
+    return record
+
+
+def create_app(latency: LatencyModel, payload_bytes: int = 2048, incidents: int = 10000) -> FastAPI:
+    """Builds the fake Table API. Incidents INC0000001..INC{incidents} exist up front."""
+    app = FastAPI()
+    by_sys_id = {}
+    by_number = {}
+    stats = {"gets": 0, "creates": 0}
+
+    def add(record: dict):
+        by_sys_id[record["sys_id"]] = record
+        by_number[record["number"]] = record
+
+    for index in range(1, incidents + 1):
+        add(make_incident(index, payload_bytes))
+
+    def project(record: dict, request: Request) -> dict:
+        fields = request.query_params.get("sysparm_fields")
+        if not fields:
+            return record
+        return {field: record[field] for field in fields.split(",") if field in record}
+
+    def json_response(body: dict, status_code: int = 200) -> Response:
+        return Response(content=codec.dumps(body), status_code=status_code, media_type="application/json")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.get("/api/now/table/incident/{sys_id}")
+    async def get_by_sys_id(sys_id: str, request: Request):
+        stats["gets"] += 1
+        await asyncio.sleep(latency.sample())
+        record = by_sys_id.get(sys_id)
+        if record is None:
+            return json_response({"error": {"message": "No Record found"}}, 404)
+        return json_response({"result": project(record, request)})
+
+    @app.get("/api/now/table/incident")
+    async def query(request: Request):
+        stats["gets"] += 1
+        await asyncio.sleep(latency.sample())
+        params = request.query_params
+        if "number" in params:
+            rows = [by_number[params["number"]]] if params["number"] in by_number else []
+        elif "sys_id" in params:
+            rows = [by_sys_id[params["sys_id"]]] if params["sys_id"] in by_sys_id else []
+        else:
+            rows = []
+            for part in params.get("sysparm_query", "").split("^"):
+                if part.startswith("numberIN"):
+                    rows.extend(by_number[n] for n in part[8:].split(",") if n in by_number)
+                elif part.startswith("sys_idIN"):
+                    rows.extend(by_sys_id[s] for s in part[8:].split(",") if s in by_sys_id)
+        limit = int(params.get("sysparm_limit", len(rows) or 1))
+        return json_response({"result": [project(row, request) for row in rows[:limit]]})
+
+    @app.post("/api/now/table/incident")
+    async def create(request: Request):
+        stats["creates"] += 1
+        body = codec.loads(await request.body())
+        await asyncio.sleep(latency.sample())
+        record = make_incident(len(by_sys_id) + 1, 0)
+        record.update(body)
+        add(record)
+        return json_response({"result": record}, 201)
+
+    return app
+
+
+class FakeServiceNow:
+    """Runs the fake Table API on a background thread of the calling process."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 8765):
+        self.url = f"http://{host}:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, name="fake-servicenow", daemon=True)
+
+    def start(self, timeout_s: float = 10.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout_s
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake ServiceNow did not start.")
+            time.sleep(0.05)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake ServiceNow Table API for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Median upstream latency")
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--payload-bytes", type=int, default=2048, help="Approximate size of one incident record")
+    parser.add_argument("--incidents", type=int, default=10000)
+    args = parser.parse_args()
+
+    latency = LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread)
+    app = create_app(latency, args.payload_bytes, args.incidents)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# benchmarks/load_test.py
+# Load test for the /mcp endpoint against a local ServiceNow stand-in.
+#
+# Starts the fake Table API (benchmarks/fake_servicenow.py) on a thread of this process,
+# launches the real server as a uvicorn subprocess pointed at it, and drives /mcp with many
+# concurrent simulated agents sending a mix of heartbeat / get_incident_details /
+# create_incident messages. Reports throughput, latency percentiles and server CPU/RSS.
+#
+#   python benchmarks/load_test.py --agents 200 --duration 30
+#   python benchmarks/load_test.py --save-baseline benchmarks/baselines/default.json
+#   python benchmarks/load_test.py --compare benchmarks/baselines/default.json  # exit 1 on regression
+#
+# Baselines are only comparable on the same machine and with the same options.
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servicenow import LATENCY_DISTRIBUTIONS, FakeServiceNow, LatencyModel, create_app  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 95, 99, 99.9)
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: list, elapsed_s: float) -> dict:
+    ordered = sorted(latencies)
+    summary = {"count": len(ordered), "throughput_per_s": round(len(ordered) / elapsed_s, 1) if elapsed_s else 0.0}
+    for pct in PERCENTILES:
+        summary[f"p{pct:g}_ms"] = round(percentile(ordered, pct) * 1000, 2)
+    return summary
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process and its children (e.g. uvicorn workers) from /proc (Linux only)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak_rss_bytes = 0
+        self._cpu_start = None
+        self._wall_start = None
+
+    def pids(self) -> list:
+        pids = [self.pid]
+        for pid in pids:
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pids.extend(int(child) for child in f.read().split())
+            except FileNotFoundError:
+                pass
+        return pids
+
+    def cpu_seconds(self) -> float:
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    # Fields after the parenthesised command name; utime and stime are fields 14 and 15
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except FileNotFoundError:
+                continue
+            total += int(fields[11]) + int(fields[12])
+        return total / CLOCK_TICKS
+
+    def rss_bytes(self) -> int:
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * PAGE_SIZE
+            except FileNotFoundError:
+                continue
+        return total
+
+    def start(self):
+        self._cpu_start = self.cpu_seconds()
+        self._wall_start = time.monotonic()
+        self.sample()
+
+    def sample(self):
+        self.peak_rss_bytes = max(self.peak_rss_bytes, self.rss_bytes())
+
+    def result(self) -> dict:
+        cpu = self.cpu_seconds() - self._cpu_start
+        wall = time.monotonic() - self._wall_start
+        return {
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent": round(100.0 * cpu / wall, 1) if wall else 0.0,
+            "rss_mb": round(self.rss_bytes() / 2**20, 1),
+            "peak_rss_mb": round(self.peak_rss_bytes / 2**20, 1),
+        }
+
+
+class Agent:
+    """One simulated agent: a WebSocket session sending one message at a time."""
+
+    def __init__(self, url: str, mix: dict, incidents: int, think_ms: float, rng: random.Random):
+        self.url = url
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.incidents = incidents
+        self.think_s = think_ms / 1000.0
+        self.rng = rng
+        # Key: op, Value: list of latencies in seconds
+        self.latencies = {op: [] for op in self.ops}
+        self.errors = {}
+
+    def message(self, op: str) -> dict:
+        message_id = str(uuid.uuid4())
+        if op == "heartbeat":
+            return {"id": message_id, "type": "heartbeat", "timestamp": int(time.time() * 1000)}
+        if op == "get":
+            number = f"INC{self.rng.randint(1, self.incidents):07d}"
+            return {"id": message_id, "type": "execute", "tool_name": "get_incident_details",
+                    "params": {"incident_number": number}}
+        return {"id": message_id, "type": "execute", "tool_name": "create_incident",
+                "params": {"short_description": "Load test incident", "caller_id": "load.test",
+                           "description": "Created by benchmarks/load_test.py"}}
+
+    async def run(self, stop_at: float, measure_from: float):
+        async with websockets.connect(self.url, max_size=None) as ws:
+            json.loads(await ws.recv())  # session_id
+            while time.monotonic() < stop_at:
+                op = self.rng.choices(self.ops, self.weights)[0]
+                message = self.message(op)
+                started = time.monotonic()
+                await ws.send(json.dumps(message))
+                while True:
+                    response = json.loads(await ws.recv())
+                    if response.get("id") == message["id"]:
+                        break
+                if started >= measure_from:  # Skip the warm-up
+                    if response.get("type") == "error":
+                        kind = response.get("error_type", "error")
+                        self.errors[kind] = self.errors.get(kind, 0) + 1
+                    else:
+                        self.latencies[op].append(time.monotonic() - started)
+                if self.think_s:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.think_s))
+
+
+async def drive(args, ws_url: str, sampler: ProcessSampler) -> dict:
+    mix = {"heartbeat": args.mix_heartbeat, "get": args.mix_get, "create": args.mix_create}
+    mix = {op: weight for op, weight in mix.items() if weight > 0}
+    rng = random.Random(args.seed)
+    agents = [Agent(ws_url, mix, args.incidents, args.think_ms, random.Random(rng.random())) for _ in range(args.agents)]
+
+    now = time.monotonic()
+    measure_from = now + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def sample_process():
+        await asyncio.sleep(max(measure_from - time.monotonic(), 0))
+        sampler.start()
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(0.5)
+            sampler.sample()
+
+    sampling = asyncio.create_task(sample_process())
+    results = await asyncio.gather(*(agent.run(stop_at, measure_from) for agent in agents), return_exceptions=True)
+    await sampling
+    server = sampler.result()
+
+    failed_agents = [r for r in results if isinstance(r, Exception)]
+    errors = {}
+    for agent in agents:
+        for kind, count in agent.errors.items():
+            errors[kind] = errors.get(kind, 0) + count
+    all_latencies = []
+    by_op = {}
+    for op in mix:
+        latencies = [value for agent in agents for value in agent.latencies[op]]
+        all_latencies.extend(latencies)
+        by_op[op] = summarize(latencies, args.duration)
+
+    return {
+        "overall": summarize(all_latencies, args.duration),
+        "by_op": by_op,
+        "errors": errors,
+        "failed_agents": len(failed_agents),
+        "server": server,
+    }
+
+
+def start_server(port: int, upstream_url: str, args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "SERVICENOW_INSTANCE_URL": upstream_url,
+        "SERVICENOW_USERNAME": "benchmark",
+        "SERVICENOW_PASSWORD": "benchmark",
+        "MCP_LOG_LEVEL": args.server_log_level,
+        "MCP_STATE_BACKEND": args.state_backend,
+        "MCP_WS_DEFLATE": "true" if args.ws_deflate == "on" else "false",
+        # Measure the server, not the client-side quota
+        "SERVICENOW_RATE_LIMIT_PER_S": env.get("SERVICENOW_RATE_LIMIT_PER_S", "0"),
+        "SERVICENOW_SESSION_RATE_LIMIT_PER_S": env.get("SERVICENOW_SESSION_RATE_LIMIT_PER_S", "0"),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+         "--workers", str(args.workers), "--ws", "ws_compression:DeflateWebSocketProtocol"],
+        cwd=REPO_ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}.")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy in time.")
+
+
+def compare(result: dict, baseline: dict, tolerance_pct: float) -> list:
+    """Returns descriptions of the metrics that regressed by more than `tolerance_pct`."""
+    regressions = []
+    limit = 1 + tolerance_pct / 100.0
+    old, new = baseline["overall"], result["overall"]
+    if new["throughput_per_s"] < old["throughput_per_s"] / limit:
+        regressions.append(f"throughput {old['throughput_per_s']} -> {new['throughput_per_s']}/s")
+    for scope, old_stats in [("overall", old)] + sorted(baseline.get("by_op", {}).items()):
+        new_stats = new if scope == "overall" else result["by_op"].get(scope)
+        if not new_stats:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if new_stats[key] > old_stats[key] * limit:
+                regressions.append(f"{scope} {key} {old_stats[key]} -> {new_stats[key]}")
+    old_cpu = baseline["server"]["cpu_seconds"] / max(old["count"], 1)
+    new_cpu = result["server"]["cpu_seconds"] / max(new["count"], 1)
+    if new_cpu > old_cpu * limit:
+        regressions.append(f"server CPU per message {old_cpu * 1e6:.0f} -> {new_cpu * 1e6:.0f} us")
+    return regressions
+
+
+def print_report(result: dict):
+    overall = result["overall"]
+    server = result["server"]
+    print(f"\n{overall['count']} messages, {overall['throughput_per_s']}/s")
+    header = f"  {'op':<10} {'count':>8} {'per_s':>8}" + "".join(f" {f'p{p:g}':>9}" for p in PERCENTILES)
+    print(header + "  (ms)")
+    for op, stats in [("all", overall)] + sorted(result["by_op"].items()):
+        row = f"  {op:<10} {stats['count']:>8} {stats['throughput_per_s']:>8}"
+        print(row + "".join(f" {stats[f'p{p:g}_ms']:>9}" for p in PERCENTILES))
+    print(f"  server: {server['cpu_seconds']}s CPU ({server['cpu_percent']}%), RSS {server['rss_mb']} MB (peak {server['peak_rss_mb']} MB)")
+    if result["errors"] or result["failed_agents"]:
+        print(f"  errors: {result['errors']}, failed agents: {result['failed_agents']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /mcp against a fake ServiceNow.")
+    parser.add_argument("--agents", type=int, default=200, help="Concurrent simulated agents (sessions)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between an agent's messages")
+    parser.add_argument("--mix-heartbeat", type=float, default=0.3)
+    parser.add_argument("--mix-get", type=float, default=0.6)
+    parser.add_argument("--mix-create", type=float, default=0.1)
+    parser.add_argument("--incidents", type=int, default=10000, help="Incidents in the fake instance")
+    parser.add_argument("--payload-bytes", type=int, default=2048, help="Approximate size of one incident record")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Median upstream latency")
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--server-log-level", default="WARNING")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--state-backend", choices=("memory", "sqlite"), default="memory",
+                        help="Use sqlite to share cache and rate limits between workers")
+    parser.add_argument("--ws-deflate", choices=("on", "off"), default="on",
+                        help="permessage-deflate on /mcp (settings from MCP_WS_DEFLATE_* in the environment)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to PATH as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against the baseline at PATH")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    upstream_port, server_port = free_port(), free_port()
+    latency = LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread, seed=args.seed)
+    upstream = FakeServiceNow(create_app(latency, args.payload_bytes, args.incidents), port=upstream_port)
+    upstream.start()
+    server = start_server(server_port, upstream.url, args)
+    try:
+        sampler = ProcessSampler(server.pid)
+        result = asyncio.run(drive(args, f"ws://127.0.0.1:{server_port}/mcp", sampler))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        upstream.stop()
+
+    result["options"] = {key: value for key, value in vars(args).items() if key not in ("save_baseline", "compare", "tolerance")}
+    print_report(result)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("options") != result["options"]:
+            print("Warning: baseline was recorded with different options.")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:g}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:g}% against {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# call_context.py
+# Per-call state that follows a tool call from the WebSocket handler down into the
+# ServiceNow client without being threaded through every signature.
+import contextvars
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a tool call runs out of time budget, locally or waiting on ServiceNow."""
+
+
+class Deadline:
+    """An absolute point in (monotonic) time by which a tool call must finish."""
+
+    __slots__ = ("budget_s", "expires_at")
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    @classmethod
+    def from_ms(cls, budget_ms: float) -> "Deadline":
+        return cls(budget_ms / 1000.0)
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        """Raises DeadlineExceeded if the deadline has already passed."""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {int(self.budget_s * 1000)} ms exceeded.")
+
+
+# Deadline of the tool call running in the current task (or thread), if any
+current_deadline: contextvars.ContextVar = contextvars.ContextVar("current_deadline", default=None)
+
+# WebSocket session the current tool call belongs to, if any
+current_session_id: contextvars.ContextVar = contextvars.ContextVar("current_session_id", default=None)
+
+# Id of the 'execute' message the current tool call is answering, if any
+current_message_id: contextvars.ContextVar = contextvars.ContextVar("current_message_id", default=None)
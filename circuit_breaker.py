@@ -0,0 +1,138 @@
+# circuit_breaker.py
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling ServiceNow while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an upstream that is failing or too slow.
+    The outcome of the last `window_size` calls is kept in a sliding window. Once at least
+    `min_calls` have been seen and either the failure rate or the slow-call rate reaches its
+    threshold, the breaker opens and calls fail fast. After `open_duration_s` it half-opens and
+    lets `half_open_max_calls` trial calls through: if they all succeed it closes again,
+    otherwise it re-opens.
+    """
+
+    def __init__(self, window_size: int = None, min_calls: int = None, failure_rate_threshold: float = None,
+                 slow_call_s: float = None, slow_call_rate_threshold: float = None, open_duration_s: float = None,
+                 half_open_max_calls: int = None):
+        self.window_size = window_size or int(os.getenv("SERVICENOW_BREAKER_WINDOW_SIZE", "50"))
+        self.min_calls = min_calls or int(os.getenv("SERVICENOW_BREAKER_MIN_CALLS", "10"))
+        self.failure_rate_threshold = failure_rate_threshold or float(os.getenv("SERVICENOW_BREAKER_FAILURE_RATE", "0.5"))
+        self.slow_call_s = slow_call_s or float(os.getenv("SERVICENOW_BREAKER_SLOW_CALL_S", "5"))
+        self.slow_call_rate_threshold = slow_call_rate_threshold or float(os.getenv("SERVICENOW_BREAKER_SLOW_CALL_RATE", "0.8"))
+        self.open_duration_s = open_duration_s or float(os.getenv("SERVICENOW_BREAKER_OPEN_S", "30"))
+        self.half_open_max_calls = half_open_max_calls or int(os.getenv("SERVICENOW_BREAKER_HALF_OPEN_CALLS", "3"))
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        # (failed, slow) for the most recent calls
+        self._window = deque(maxlen=self.window_size)
+        self._failures = 0
+        self._slow = 0
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def acquire(self):
+        """Admits one call, or raises UpstreamUnavailable while the breaker is open."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == OPEN or (
+                self._state == HALF_OPEN and self._half_open_in_flight >= self.half_open_max_calls
+            ):
+                self.rejected += 1
+                retry_in = max(self._opened_at + self.open_duration_s - time.monotonic(), 0.0)
+                raise UpstreamUnavailable(f"ServiceNow circuit breaker is open; retry in {retry_in:.1f}s.")
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight += 1
+
+    def record_success(self, duration_s: float):
+        self._record(failed=False, slow=duration_s >= self.slow_call_s)
+
+    def record_failure(self, duration_s: float):
+        self._record(failed=True, slow=duration_s >= self.slow_call_s)
+
+    def record_ignored(self):
+        """Releases an admitted call whose outcome says nothing about upstream health."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_in_flight:
+                self._half_open_in_flight -= 1
+
+    def _record(self, failed: bool, slow: bool):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(self._half_open_in_flight - 1, 0)
+                if failed or slow:
+                    self._open()
+                    return
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._close()
+                return
+            if self._state == OPEN:
+                return  # A call admitted before the breaker opened
+
+            if len(self._window) == self._window.maxlen:
+                old_failed, old_slow = self._window[0]
+                self._failures -= old_failed
+                self._slow -= old_slow
+            self._window.append((failed, slow))
+            self._failures += failed
+            self._slow += slow
+
+            calls = len(self._window)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.failure_rate_threshold
+                or self._slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._open()
+
+    def _maybe_half_open(self):
+        # Caller holds the lock
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration_s:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+            self._half_open_successes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self._window.clear()
+        self._failures = 0
+        self._slow = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._window)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "failure_rate": round(self._failures / calls, 4) if calls else 0.0,
+                "slow_call_rate": round(self._slow / calls, 4) if calls else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,63 @@
+# codec.py
+# JSON encoding/decoding used on the hot path: WebSocket frames and ServiceNow bodies.
+# Uses orjson when it is installed and falls back to the standard library otherwise;
+# MCP_JSON_CODEC=json forces the standard library.
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+class JsonCodec:
+    """Standard-library codec producing compact UTF-8 JSON."""
+
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def dumps_text(self, obj) -> str:
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        """Decodes JSON from str or UTF-8 bytes."""
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """orjson-backed codec; several times faster than the standard library on large records."""
+
+    name = "orjson"
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps_text(self, obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, data):
+        """Decodes JSON from str or UTF-8 bytes."""
+        return orjson.loads(data)
+
+
+def get_codec(name: str = "auto"):
+    """Returns the codec called `name` ("json", "orjson"), or the fastest available for "auto"."""
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("MCP_JSON_CODEC=orjson but orjson is not installed.")
+        return OrjsonCodec()
+    if name == "json":
+        return JsonCodec()
+    raise ValueError(f"Unknown JSON codec: '{name}'")
+
+
+# Codec shared by the server and the ServiceNow clients
+codec = get_codec(os.getenv("MCP_JSON_CODEC", "auto"))
@@ -0,0 +1,170 @@
+# incident_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from codec import codec
+
+
+class _Entry:
+    __slots__ = ("record", "number", "fields", "size", "expires_at")
+
+    def __init__(self, record: dict, number: str, fields, size: int, expires_at: float):
+        self.record = record
+        self.number = number
+        self.fields = fields  # frozenset of projected fields, or None for a full record
+        self.size = size
+        self.expires_at = expires_at
+
+    def covers(self, fields) -> bool:
+        """True if this entry holds every field of the requested projection."""
+        if self.fields is None:
+            return True
+        return fields is not None and self.fields.issuperset(fields)
+
+
+class IncidentCache:
+    """
+    In-process read-through cache for incident records.
+    Each record is stored once, keyed by sys_id, and is also reachable through its number.
+    Entries expire after a TTL and the least recently used ones are evicted once either
+    the entry count or the approximate byte size exceeds its limit.
+    Projected records (sysparm_fields) are cached with their field set and only serve
+    lookups asking for a subset of those fields.
+    Expired entries are kept for a further stale window and only returned by get_stale().
+    """
+
+    def __init__(self, ttl_s: float = None, max_entries: int = None, max_bytes: int = None, stale_ttl_s: float = None):
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("SERVICENOW_CACHE_TTL_S", "30"))
+        # How long past expiry an entry is kept to answer lookups while ServiceNow is unavailable
+        self.stale_ttl_s = stale_ttl_s if stale_ttl_s is not None else float(os.getenv("SERVICENOW_CACHE_STALE_TTL_S", "300"))
+        self.max_entries = max_entries or int(os.getenv("SERVICENOW_CACHE_MAX_ENTRIES", "1024"))
+        self.max_bytes = max_bytes or int(os.getenv("SERVICENOW_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+        # Key: sys_id, Value: _Entry. Ordered from least to most recently used.
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Key: incident number, Value: sys_id
+        self._numbers = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    def get(self, incident_number: str = None, sys_id: str = None, fields=None):
+        """
+        Returns a copy of the cached record (projected to `fields` if given), or None on a
+        miss, an expired entry or an entry that lacks some of the requested fields.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._lookup(incident_number, sys_id, fields)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry.record["sys_id"])
+            self.hits += 1
+            return self._copy(entry, fields)
+
+    def get_stale(self, incident_number: str = None, sys_id: str = None, fields=None):
+        """Like get(), but also returns entries that expired less than stale_ttl_s ago."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._lookup(incident_number, sys_id, fields)
+            if entry is None or entry.expires_at + self.stale_ttl_s <= time.monotonic():
+                return None
+            self.stale_hits += 1
+            return self._copy(entry, fields)
+
+    def _lookup(self, incident_number: str, sys_id: str, fields):
+        # Caller holds the lock. Drops entries that are past even the stale window.
+        key = sys_id or self._numbers.get(incident_number)
+        entry = self._entries.get(key) if key else None
+        if entry is None or (incident_number and entry.number != incident_number) or not entry.covers(fields):
+            return None
+        if entry.expires_at + self.stale_ttl_s <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    @staticmethod
+    def _copy(entry: _Entry, fields) -> dict:
+        if fields is None:
+            return dict(entry.record)
+        return {f: entry.record[f] for f in fields if f in entry.record}
+
+    def put(self, record: dict, fields=None):
+        """
+        Stores a record under its sys_id and number, evicting LRU entries as needed.
+        `fields` is the projection the record was fetched with (None for the full record).
+        """
+        sys_id = record.get("sys_id") if record else None
+        if not self.enabled or not sys_id or not isinstance(sys_id, str):
+            return
+        number = record.get("number") if isinstance(record.get("number"), str) else None
+        size = len(codec.dumps(record))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if sys_id in self._entries:
+                self._remove(sys_id)
+            self._entries[sys_id] = _Entry(
+                dict(record), number, frozenset(fields) if fields is not None else None,
+                size, time.monotonic() + self.ttl_s
+            )
+            if number:
+                self._numbers[number] = sys_id
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, incident_number: str = None, sys_id: str = None):
+        """Drops the record reachable through either key, if cached."""
+        with self._lock:
+            key = sys_id if sys_id in self._entries else self._numbers.get(incident_number)
+            if key and key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._numbers.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_hits": self.stale_hits,
+        }
+
+    def _remove(self, sys_id: str):
+        # Caller holds the lock
+        entry = self._entries.pop(sys_id)
+        self._bytes -= entry.size
+        if entry.number and self._numbers.get(entry.number) == sys_id:
+            del self._numbers[entry.number]
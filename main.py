@@ -1,49 +1,121 @@
 import json
+import os
+import time
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import Response
+from starlette.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Union
 import logging
 import uuid # Import uuid for generating session IDs
+from contextlib import asynccontextmanager
+from codec import codec
+from state_backend import SessionRegistry, get_state_backend
+from outbound_queue import OutboundQueue, PRIORITY_LOW, PRIORITY_NORMAL, SLOW_CONSUMER_POLICIES
 
 # --- Connection Manager for MCP Sessions ---
 class ConnectionManager:
-    def __init__(self):
+    """
+    Tracks the open sessions and writes to them. Each session has a bounded outbound queue
+    drained by its own writer task (see outbound_queue.py), so a slow-reading agent only
+    ever holds up producers of its own session, and only as far as the slow-consumer policy allows.
+    """
+
+    def __init__(self, session_registry: SessionRegistry = None, max_messages: int = None, max_bytes: int = None,
+                 policy: str = None, stall_timeout_s: float = None):
         # Dictionary to store active WebSocket connections
         # Key: session_id (string), Value: WebSocket
         self.active_connections: Dict[str, WebSocket] = {}
+        # Key: session_id (string), Value: that session's OutboundQueue
+        self.outbound: Dict[str, OutboundQueue] = {}
+        # Sessions of every worker process when the state backend is shared
+        self.session_registry = session_registry or SessionRegistry()
+        self.max_messages = max_messages or int(os.getenv("MCP_OUTBOUND_MAX_MESSAGES", "256"))
+        self.max_bytes = max_bytes or int(os.getenv("MCP_OUTBOUND_MAX_BYTES", str(8 * 1024 * 1024)))
+        self.policy = policy or os.getenv("MCP_SLOW_CONSUMER_POLICY", "drop")
+        self.stall_timeout_s = stall_timeout_s if stall_timeout_s is not None else float(os.getenv("MCP_OUTBOUND_STALL_TIMEOUT_S", "30"))
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: '{self.policy}'")
 
     async def connect(self, websocket: WebSocket) -> str:
         """Accepts a new WebSocket connection and assigns a session ID."""
         session_id = str(uuid.uuid4()) # Generate a unique session ID
         await websocket.accept()
         self.active_connections[session_id] = websocket
-        logger.info(f"WebSocket connected. New session ID: {session_id}. Total active connections: {len(self.active_connections)}")
+
+        async def send(frame: bytes, parent: "Span"):
+            # The socket write, in the writer task, as a child of the producer's mcp.send span
+            with tracer.span("mcp.write", parent=parent, attributes={"bytes": len(frame)}):
+                await websocket.send_text(frame.decode("utf-8"))
+            WS_BYTES_SENT.inc(amount=len(frame))
+
+        queue = self.outbound[session_id] = OutboundQueue(
+            send, lambda code, reason: websocket.close(code=code, reason=reason),
+            max_messages=self.max_messages, max_bytes=self.max_bytes, policy=self.policy,
+            stall_timeout_s=self.stall_timeout_s, on_event=lambda action: SLOW_CONSUMER_EVENTS.inc(action)
+        )
+        queue.start()
+        await self._update_registry(self.session_registry.register, session_id)
+        logger.info("WebSocket connected. New session ID: %s. Total active connections: %d", session_id, len(self.active_connections))
         return session_id
 
-    def disconnect(self, session_id: str):
+    async def disconnect(self, session_id: str):
         """Removes a disconnected WebSocket from the active connections."""
         if session_id in self.active_connections:
             del self.active_connections[session_id]
-            logger.info(f"WebSocket disconnected for session ID: {session_id}. Total active connections: {len(self.active_connections)}")
-
-    async def send_personal_message(self, message: Union[str, Dict], session_id: str):
-        """Sends a message to a specific WebSocket session."""
-        websocket = self.active_connections.get(session_id)
-        if websocket:
-            try:
+            self.outbound.pop(session_id).discard()
+            logger.info("WebSocket disconnected for session ID: %s. Total active connections: %d", session_id, len(self.active_connections))
+            await self._update_registry(self.session_registry.unregister, session_id)
+
+    async def _update_registry(self, update, session_id: str):
+        """
+        Registers or unregisters a session. The shared registry writes to SQLite and may wait on
+        another worker's lock, so it runs off the event loop. Failures are logged, not raised:
+        they only skew the all-workers session count and must not leave a session half set up or torn down.
+        """
+        try:
+            if self.session_registry.shared:
+                await asyncio.to_thread(update, session_id)
+            else:
+                update(session_id)
+        except Exception as e:
+            logger.warning("Failed to update the session registry for session %s: %s", session_id, e)
+
+    async def send_personal_message(self, message: Union[str, bytes, Dict], session_id: str, priority: int = PRIORITY_NORMAL):
+        """
+        Queues a message for a specific WebSocket session. Bytes are taken as already-encoded JSON.
+        Waits while the session's queue is full, unless the slow-consumer policy drops or disconnects.
+        """
+        queue = self.outbound.get(session_id)
+        if queue:
+            # Covers encoding and queueing; the socket write is its mcp.write child, in the writer task
+            with tracer.span("mcp.send") as span:
                 if isinstance(message, dict):
-                    await websocket.send_json(message)
-                else:
-                    await websocket.send_text(message)
-            except WebSocketDisconnect:
-                logger.warning(f"Attempted to send to disconnected WebSocket for session ID {session_id}. Removing.")
-                self.disconnect(session_id)
-            except Exception as e:
-                logger.error(f"Error sending message to session ID {session_id}: {e}", exc_info=True)
+                    # Encode once with the fast codec instead of send_json's stdlib pass
+                    message = codec.dumps(message)
+                elif isinstance(message, str):
+                    message = message.encode("utf-8")
+                span.set_attribute("bytes", len(message))
+                if not await queue.put(message, priority, context=span):
+                    span.set_attribute("dropped", True)
         else:
-            logger.warning(f"Attempted to send message to non-existent session ID: {session_id}")
+            logger.warning("Attempted to send message to non-existent session ID: %s", session_id)
+
+    def outbound_stats(self) -> dict:
+        depths = [queue.depth for queue in self.outbound.values()]
+        return {
+            "policy": self.policy,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            "queued_messages": sum(depths),
+            "queued_bytes": sum(queue.bytes for queue in self.outbound.values()),
+            "max_depth": max(depths, default=0),
+            "paused_producers": sum(queue.paused for queue in self.outbound.values()),
+            # Only sessions with something queued, so the list stays short while clients keep up
+            "backlogged_sessions": {session_id: queue.stats() for session_id, queue in self.outbound.items()
+                                    if queue.depth or queue.paused}
+        }
 
     # You might add a broadcast method later if needed:
     # async def broadcast(self, message: str):
@@ -51,34 +123,252 @@ class ConnectionManager:
     #         await connection.send_text(message)
 
 # Initialize the ConnectionManager
-manager = ConnectionManager()
-
-
-from servicenow_client import ServiceNowClient
+manager = ConnectionManager(get_state_backend().session_registry())
+
+# --- Per-Session Execution State ---
+# Maximum number of tool calls a single session may have executing at once
+SESSION_MAX_INFLIGHT = int(os.getenv("MCP_SESSION_MAX_INFLIGHT", "8"))
+# Default response mode: "unordered" (send as each call completes) or "ordered" (request order)
+RESPONSE_ORDER = os.getenv("MCP_RESPONSE_ORDER", "unordered")
+
+# --- Deadlines ---
+# An 'execute' message may carry 'deadline_ms'; otherwise the tool's default applies.
+# Work still running when its deadline passes is abandoned with error_type "timeout".
+DEFAULT_DEADLINE_MS = int(os.getenv("MCP_DEFAULT_DEADLINE_MS", "30000"))
+MAX_DEADLINE_MS = int(os.getenv("MCP_MAX_DEADLINE_MS", "300000"))
+TOOL_DEFAULT_DEADLINES_MS = {
+    "get_incident_details": 10000,
+    "get_incidents_batch": 20000,
+    "create_incident": 15000,
+    "create_incidents_bulk": 60000,
+    "query_incidents": 120000,
+}
+
+class McpSession:
+    """Tracks the in-flight tool calls of one WebSocket session."""
+
+    def __init__(self, session_id: str, max_inflight: int, ordered: bool):
+        self.session_id = session_id
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.ordered = ordered
+        # Key: message id, Value: task executing that message
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._last_turn = None
+
+    def next_turn(self):
+        """
+        Reserves the next response slot in ordered mode.
+        Returns (previous, done): pass `previous` to wait_turn before sending; `done` is resolved by start().
+        """
+        previous = self._last_turn
+        done = asyncio.get_running_loop().create_future()
+        self._last_turn = done
+        return previous, done
+
+    @staticmethod
+    async def wait_turn(previous):
+        """
+        Waits until every response before this turn has been sent. Shielded, because cancelling
+        a waiter (a 'cancel', an expired deadline) would otherwise cancel the earlier call's
+        future too and let later responses overtake a call that is still running.
+        """
+        if previous is not None:
+            await asyncio.shield(previous)
+
+    def start(self, message_id: str, coro, turn, span: "Span") -> asyncio.Task:
+        """
+        Runs `coro` as the task executing `message_id`. Its bookkeeping is released by a done
+        callback rather than the coroutine's own finally, which never runs if the task is
+        cancelled before it starts (a 'cancel' read in the same batch as its 'execute').
+        """
+        task = asyncio.create_task(coro)
+        self.tasks[message_id] = task
+        task.add_done_callback(lambda task: self._finish(message_id, task, turn, span))
+        return task
+
+    def _finish(self, message_id: str, task: asyncio.Task, turn, span: "Span"):
+        if self.tasks.get(message_id) is task:
+            del self.tasks[message_id]
+        span.end()
+        if turn is not None:
+            previous, done = turn
+            # Later responses must still wait for every earlier one, even if this call never ran.
+            # Turn futures are only ever resolved here, so `previous` being done means it was sent
+            if previous is None or previous.done():
+                done.set_result(None)
+            else:
+                previous.add_done_callback(lambda _: done.set_result(None))
+
+    def cancel(self, message_id: str) -> bool:
+        """
+        Cancels the in-flight call for `message_id`. Its upstream request is aborted, its
+        concurrency slot is released and no response is sent for it.
+        Returns False if no such call is in flight.
+        """
+        task = self.tasks.get(message_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def cancel_all(self) -> int:
+        """Cancels every in-flight call, e.g. when the socket goes away. Returns how many."""
+        cancelled = 0
+        for message_id in list(self.tasks):
+            cancelled += self.cancel(message_id)
+        return cancelled
+
+
+from servicenow_client import AsyncServiceNowClient, INCIDENT_FIELD_PROFILES
+from call_context import Deadline, DeadlineExceeded, current_deadline, current_message_id, current_session_id
+from circuit_breaker import UpstreamUnavailable
+from structured_logging import setup_logging
+from metrics import CONTENT_TYPE, registry
+from tracing import Span, tracer
+from tool_registry import Tool, ToolRegistry, UnknownToolError, ValidationError
+from precompressed import PrecompressedBody
 
 # --- Configuration & Logging ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Log records are queued and written by a background thread (JSON lines by default;
+# MCP_LOG_FORMAT=text for the classic format). See structured_logging.py for the knobs.
+log_pipeline = setup_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled upstream connections on shutdown
+    await sn_client.aclose()
+    logger.info("AsyncServiceNowClient closed.")
+    tracer.shutdown()
+    log_pipeline.stop()
+
 app = FastAPI(
     title="ServiceNow MCP Server",
     description="Model Context Protocol Server for ServiceNow Incident Management",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# Compresses HTTP responses (e.g. /metrics, /health) for clients that accept gzip.
+# Responses that already carry a Content-Encoding, like the precompressed /tools, pass through.
+# The /mcp socket is compressed by permessage-deflate instead (see ws_compression.py).
+HTTP_GZIP_MIN_SIZE = int(os.getenv("MCP_HTTP_GZIP_MIN_SIZE", "1024"))
+HTTP_GZIP_LEVEL = int(os.getenv("MCP_HTTP_GZIP_LEVEL", "6"))
+app.add_middleware(GZipMiddleware, minimum_size=HTTP_GZIP_MIN_SIZE, compresslevel=HTTP_GZIP_LEVEL)
+
 # Initialize ServiceNow Client
+# The async client keeps upstream calls off the event loop, so a slow ServiceNow
+# round trip in one session does not stall the others (or their heartbeats).
 try:
-    sn_client = ServiceNowClient()
-    logger.info("ServiceNowClient initialized successfully.")
+    sn_client = AsyncServiceNowClient()
+    logger.info("AsyncServiceNowClient initialized successfully.")
 except ValueError as e:
-    logger.error(f"Failed to initialize ServiceNowClient: {e}. Ensure .env variables are set.")
+    logger.error("Failed to initialize AsyncServiceNowClient: %s. Ensure .env variables are set.", e)
     # Exit or handle this more gracefully in a production environment
     exit(1)
 
+# --- Metrics ---
+# Served at /metrics in the Prometheus text format. Counters and histograms are recorded
+# without locks (see metrics.py); the rest is read from existing state at scrape time.
+# Label values are limited to known tools and message types to bound cardinality.
+KNOWN_MESSAGE_TYPES = ("heartbeat", "execute", "cancel")
+
+MESSAGES_RECEIVED = registry.counter("mcp_messages_received_total", "MCP messages received, by type.", ("type",))
+WS_BYTES_RECEIVED = registry.counter("mcp_websocket_bytes_received_total", "Size of WebSocket text frames received, in characters (bytes for ASCII JSON).")
+WS_BYTES_SENT = registry.counter("mcp_websocket_bytes_sent_total", "Bytes of WebSocket frames sent.")
+TOOL_CALLS = registry.counter("mcp_tool_calls_total", "Tool calls finished, by tool and outcome.", ("tool", "outcome"))
+TOOL_PHASE_SECONDS = registry.histogram(
+    "mcp_tool_phase_seconds",
+    "Tool call latency by phase: queue (waiting for a session slot), upstream (running the tool), "
+    "serialize (encoding its result frames).",
+    ("tool", "phase"))
+TOOL_CALLS_IN_FLIGHT = registry.gauge("mcp_tool_calls_in_flight", "Tool calls queued or executing.")
+SLOW_CONSUMER_EVENTS = registry.counter(
+    "mcp_slow_consumer_events_total",
+    "Outbound frames that did not fit a session's queue, by action: paused (producer waited), "
+    "dropped (low-priority frame) or disconnected (session closed).",
+    ("action",))
+TOOLS_REQUESTS = registry.counter("mcp_tools_requests_total", "/tools discovery requests, by status and content coding.",
+                                  ("status", "encoding"))
+
+registry.callback("mcp_active_sessions", "Open WebSocket sessions on this worker, and on all workers sharing state.",
+                  lambda: {("worker",): len(manager.active_connections), ("all",): manager.session_registry.count()},
+                  labelnames=("scope",))
+# Aggregated over sessions: a per-session label would add series on every connection.
+# The backlog of individual sessions is listed under "outbound" in /health.
+registry.callback("mcp_outbound_queue_messages", "Frames waiting in outbound queues: total, and in the fullest session queue.",
+                  lambda: {("sum",): sum(queue.depth for queue in manager.outbound.values()),
+                           ("max",): max((queue.depth for queue in manager.outbound.values()), default=0)},
+                  labelnames=("aggregate",))
+registry.callback("mcp_outbound_queue_bytes", "Bytes waiting in outbound queues: total, and in the largest session queue.",
+                  lambda: {("sum",): sum(queue.bytes for queue in manager.outbound.values()),
+                           ("max",): max((queue.bytes for queue in manager.outbound.values()), default=0)},
+                  labelnames=("aggregate",))
+registry.callback("servicenow_connections_in_use", "Upstream connections currently carrying a request.",
+                  lambda: sn_client.pool_stats()["in_use"])
+registry.callback("servicenow_coalesced_lookups_total", "Incident lookups served by joining an identical in-flight request.",
+                  lambda: sn_client.single_flight.stats()["coalesced"], kind="counter")
+registry.callback("mcp_incident_cache_lookups_total", "Incident cache lookups, by result.",
+                  lambda: {("hit",): sn_client.cache.hits, ("miss",): sn_client.cache.misses},
+                  kind="counter", labelnames=("result",))
+registry.callback("mcp_incident_cache_hit_ratio", "Share of incident cache lookups that were hits.",
+                  lambda: sn_client.cache.stats()["hit_ratio"])
+registry.callback("servicenow_circuit_breaker_state", "1 for the circuit breaker's current state, 0 otherwise.",
+                  lambda: {(state,): int(state == sn_client.circuit_breaker.state) for state in ("closed", "open", "half_open")},
+                  labelnames=("state",))
+registry.callback("servicenow_rate_limit_waiting", "Upstream requests waiting for a rate-limit token.",
+                  lambda: sn_client.rate_limiter.waiting)
+
+def tool_label(tool_name: str) -> str:
+    return tool_name if tool_name in tool_registry else "unknown"
+
 # --- MCP Tool Definitions ---
 # These describe the capabilities to the AI model.
 # They align with the operations in servicenow_client.py
 
+# Most incidents one create_incidents_bulk call may create
+BULK_CREATE_MAX_ITEMS = int(os.getenv("MCP_BULK_CREATE_MAX_ITEMS", "500"))
+
+# Most records one query_incidents call may stream
+QUERY_MAX_RECORDS = int(os.getenv("MCP_QUERY_MAX_RECORDS", "10000"))
+
+# Input accepted for one new incident, shared by create_incident and create_incidents_bulk
+CREATE_INCIDENT_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "short_description": {
+            "type": "string",
+            "description": "A concise summary of the incident.",
+            "example": "User unable to log in."
+        },
+        "caller_id": {
+            "type": "string",
+            "description": "The user_name or sys_id of the person reporting the incident.",
+            "example": "abel.tuter"
+        },
+        "description": {
+            "type": "string",
+            "description": "A detailed explanation of the incident.",
+            "example": "The user is receiving an 'invalid credentials' error repeatedly when trying to access the portal."
+        },
+        "impact": {
+            "type": "string",
+            "description": "The impact of the incident (e.g., '1' for High, '2' for Medium, '3' for Low).",
+            "enum": ["1", "2", "3"],
+            "example": "2"
+        },
+        "urgency": {
+            "type": "string",
+            "description": "The urgency of the incident (e.g., '1' for High, '2' for Medium, '3' for Low).",
+            "enum": ["1", "2", "3"],
+            "example": "2"
+        }
+        # Add more fields as needed for incident creation
+    },
+    "required": ["short_description", "caller_id"]
+}
+
 TOOLS_DEFINITIONS = [
     {
         "name": "get_incident_details",
@@ -95,6 +385,22 @@ TOOLS_DEFINITIONS = [
                     "type": "string",
                     "description": "The sys_id (unique record identifier) of the incident.",
                     "example": "62826bf03710200044e0bfc129e415f2"
+                },
+                "bypass_cache": {
+                    "type": "boolean",
+                    "description": "Skip the server-side incident cache and read the record from ServiceNow.",
+                    "default": False
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only return these incident fields (number and sys_id are always included).",
+                    "example": ["state", "priority", "assigned_to"]
+                },
+                "field_profile": {
+                    "type": "string",
+                    "description": "Named field projection used when 'fields' is not given. Defaults to the server's profile.",
+                    "enum": list(INCIDENT_FIELD_PROFILES)
                 }
             },
             "required": [], # We will handle logic for at least one of these being present
@@ -105,7 +411,7 @@ TOOLS_DEFINITIONS = [
         },
         "output_schema": {
             "type": "object",
-            "description": "The full JSON object representing the incident record from ServiceNow.",
+            "description": "The JSON object representing the incident record from ServiceNow, limited to the requested fields.",
             "properties": {
                 # This will vary based on what ServiceNow returns, but generally includes:
                 "number": {"type": "string"},
@@ -121,42 +427,65 @@ TOOLS_DEFINITIONS = [
         }
     },
     {
-        "name": "create_incident",
-        "description": "Creates a new incident record in ServiceNow.",
+        "name": "get_incidents_batch",
+        "description": "Retrieves many ServiceNow incidents at once by number and/or sys_id.",
         "input_schema": {
             "type": "object",
             "properties": {
-                "short_description": {
-                    "type": "string",
-                    "description": "A concise summary of the incident.",
-                    "example": "User unable to log in."
+                "incident_numbers": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Incident numbers to retrieve.",
+                    "example": ["INC0010001", "INC0010002"]
                 },
-                "caller_id": {
-                    "type": "string",
-                    "description": "The user_name or sys_id of the person reporting the incident.",
-                    "example": "abel.tuter"
+                "sys_ids": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Incident sys_ids to retrieve.",
+                    "example": ["62826bf03710200044e0bfc129e415f2"]
                 },
-                "description": {
-                    "type": "string",
-                    "description": "A detailed explanation of the incident.",
-                    "example": "The user is receiving an 'invalid credentials' error repeatedly when trying to access the portal."
+                "bypass_cache": {
+                    "type": "boolean",
+                    "description": "Skip the server-side incident cache and read every record from ServiceNow.",
+                    "default": False
                 },
-                "impact": {
-                    "type": "string",
-                    "description": "The impact of the incident (e.g., '1' for High, '2' for Medium, '3' for Low).",
-                    "enum": ["1", "2", "3"],
-                    "example": "2"
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only return these incident fields (number and sys_id are always included).",
+                    "example": ["state", "priority", "assigned_to"]
                 },
-                "urgency": {
+                "field_profile": {
                     "type": "string",
-                    "description": "The urgency of the incident (e.g., '1' for High, '2' for Medium, '3' for Low).",
-                    "enum": ["1", "2", "3"],
-                    "example": "2"
+                    "description": "Named field projection used when 'fields' is not given. Defaults to the server's profile.",
+                    "enum": list(INCIDENT_FIELD_PROFILES)
                 }
-                # Add more fields as needed for incident creation
             },
-            "required": ["short_description", "caller_id"]
+            "required": [], # At least one of the key lists must be non-empty
+            "anyOf": [
+                {"required": ["incident_numbers"], "properties": {"incident_numbers": {"minItems": 1}}},
+                {"required": ["sys_ids"], "properties": {"sys_ids": {"minItems": 1}}}
+            ]
         },
+        "output_schema": {
+            "type": "object",
+            "description": "The found incidents in request order, plus the keys that matched no incident.",
+            "properties": {
+                "incidents": {"type": "array", "items": {"type": "object"}},
+                "not_found": {
+                    "type": "object",
+                    "properties": {
+                        "numbers": {"type": "array", "items": {"type": "string"}},
+                        "sys_ids": {"type": "array", "items": {"type": "string"}}
+                    }
+                }
+            }
+        }
+    },
+    {
+        "name": "create_incident",
+        "description": "Creates a new incident record in ServiceNow.",
+        "input_schema": CREATE_INCIDENT_INPUT_SCHEMA,
         "output_schema": {
             "type": "object",
             "description": "The full JSON object of the newly created incident, including its number and sys_id.",
@@ -169,26 +498,339 @@ TOOLS_DEFINITIONS = [
             },
             "additionalProperties": True
         }
+    },
+    {
+        "name": "create_incidents_bulk",
+        "description": "Creates many incident records in ServiceNow in as few requests as possible.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "incidents": {
+                    "type": "array",
+                    "description": "The incidents to create, each with the same fields as create_incident.",
+                    "items": CREATE_INCIDENT_INPUT_SCHEMA,
+                    "minItems": 1,
+                    "maxItems": BULK_CREATE_MAX_ITEMS
+                },
+                "batch_size": {
+                    "type": "integer",
+                    "description": "How many creates to pack into one ServiceNow Batch API request. Defaults to the server setting.",
+                    "minimum": 1,
+                    "maximum": 100
+                }
+            },
+            "required": ["incidents"]
+        },
+        "output_schema": {
+            "type": "object",
+            "description": "Per-item outcome in input order, plus created and failed counts.",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "success": {"type": "boolean"},
+                            "result": {"type": "object"},
+                            "error": {"type": "string"}
+                        }
+                    }
+                },
+                "created": {"type": "integer"},
+                "failed": {"type": "integer"},
+                "used_batch_api": {"type": "boolean"}
+            }
+        }
+    },
+    {
+        "name": "query_incidents",
+        "description": "Lists ServiceNow incidents matching an encoded query. Results are streamed as 'tool_result_chunk' messages (one per page), followed by a final 'tool_result' summary.",
+        "streaming": True,
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "A ServiceNow encoded query. Empty matches every incident.",
+                    "example": "active=true^priority=1"
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only return these incident fields (number and sys_id are always included).",
+                    "example": ["state", "priority", "assigned_to"]
+                },
+                "field_profile": {
+                    "type": "string",
+                    "description": "Named field projection used when 'fields' is not given. Defaults to the server's profile.",
+                    "enum": list(INCIDENT_FIELD_PROFILES)
+                },
+                "page_size": {
+                    "type": "integer",
+                    "description": "Records per upstream page and per 'tool_result_chunk' message.",
+                    "minimum": 1,
+                    "example": 100
+                },
+                "pagination": {
+                    "type": "string",
+                    "description": "'offset' pages with sysparm_offset and keeps any ORDERBY in the query; 'keyset' orders by sys_id and stays fast for deep result sets.",
+                    "enum": ["offset", "keyset"],
+                    "default": "offset"
+                },
+                "max_records": {
+                    "type": "integer",
+                    "description": "Stop after this many records.",
+                    "minimum": 1,
+                    "maximum": QUERY_MAX_RECORDS
+                }
+            },
+            "required": []
+        },
+        "output_schema": {
+            "type": "object",
+            "description": "Summary sent after the last chunk. Each chunk carries 'seq' and a 'result' list of incident records.",
+            "properties": {
+                "count": {"type": "integer"},
+                "chunks": {"type": "integer"}
+            }
+        }
     }
 ]
 
+# --- Tool Handlers ---
+# Params reach a handler only after passing the tool's input_schema (see tool_registry.py).
+
+async def get_incident_details(tool_params: Dict[str, Any], send_chunk) -> Dict[str, Any]:
+    return await sn_client.get_incident(
+        incident_number=tool_params.get("incident_number"),
+        sys_id=tool_params.get("sys_id"),
+        bypass_cache=tool_params.get("bypass_cache", False),
+        fields=tool_params.get("fields"),
+        field_profile=tool_params.get("field_profile")
+    )
+
+async def get_incidents_batch(tool_params: Dict[str, Any], send_chunk) -> Dict[str, Any]:
+    return await sn_client.get_incidents(
+        numbers=tool_params.get("incident_numbers"),
+        sys_ids=tool_params.get("sys_ids"),
+        bypass_cache=tool_params.get("bypass_cache", False),
+        fields=tool_params.get("fields"),
+        field_profile=tool_params.get("field_profile")
+    )
+
+async def create_incident(tool_params: Dict[str, Any], send_chunk) -> Dict[str, Any]:
+    return await sn_client.create_incident(
+        short_description=tool_params.get("short_description"),
+        caller_id=tool_params.get("caller_id"),
+        description=tool_params.get("description"),
+        impact=tool_params.get("impact"),
+        urgency=tool_params.get("urgency")
+        # Pass other optional parameters dynamically
+    )
+
+async def create_incidents_bulk(tool_params: Dict[str, Any], send_chunk) -> Dict[str, Any]:
+    # Only forward the fields create_incident accepts
+    allowed = CREATE_INCIDENT_INPUT_SCHEMA["properties"]
+    return await sn_client.create_incidents(
+        [{k: v for k, v in item.items() if k in allowed} for item in tool_params["incidents"]],
+        batch_size=tool_params.get("batch_size")
+    )
+
+async def query_incidents(tool_params: Dict[str, Any], send_chunk) -> Dict[str, Any]:
+    count = chunks = 0
+    # Each upstream page is forwarded as soon as it arrives and is not kept afterwards
+    async for page in sn_client.iter_incident_pages(
+        encoded_query=tool_params.get("query", ""),
+        fields=tool_params.get("fields"),
+        field_profile=tool_params.get("field_profile"),
+        page_size=tool_params.get("page_size"),
+        pagination=tool_params.get("pagination", "offset"),
+        max_records=tool_params.get("max_records", QUERY_MAX_RECORDS)
+    ):
+        await send_chunk(page)
+        count += len(page)
+        chunks += 1
+    return {"count": count, "chunks": chunks}
+
+# Every definition in TOOLS_DEFINITIONS needs a handler here, and the other way around
+TOOL_HANDLERS = {
+    "get_incident_details": get_incident_details,
+    "get_incidents_batch": get_incidents_batch,
+    "create_incident": create_incident,
+    "create_incidents_bulk": create_incidents_bulk,
+    "query_incidents": query_incidents,
+}
+
+# Schemas are compiled here, once, at import
+tool_registry = ToolRegistry.from_definitions(TOOLS_DEFINITIONS, TOOL_HANDLERS)
+
 # --- HTTP Endpoint for Tool Discovery (MCP Specification requires /tools) ---
+# Agents fetch this on every (re)connect, so the document is serialized and compressed once
+# per registry version and served from memory; clients revalidate with If-None-Match.
+TOOLS_CACHE_MAX_AGE_S = int(os.getenv("MCP_TOOLS_CACHE_MAX_AGE_S", "60"))
+TOOLS_CACHE_CONTROL = f"public, max-age={TOOLS_CACHE_MAX_AGE_S}"
+
+_tools_document = None  # (registry version, PrecompressedBody)
+
+def tools_document() -> PrecompressedBody:
+    """The /tools body for the current registry, rebuilt only when the registry has changed."""
+    global _tools_document
+    if _tools_document is None or _tools_document[0] != tool_registry.version:
+        _tools_document = (tool_registry.version, PrecompressedBody(codec.dumps(tool_registry.definitions())))
+        logger.info("Built MCP tool definitions document (version %d, codings: %s).", tool_registry.version,
+                    ", ".join(sorted(_tools_document[1].variants)))
+    return _tools_document[1]
+
+tools_document()  # Built at startup rather than on the first request
+
 @app.get("/tools")
-async def get_mcp_tools():
+async def get_mcp_tools(request: Request):
     """
     Endpoint for AI agents to discover the available tools and their schemas.
     This adheres to the MCP specification's discovery mechanism.
     """
-    logger.info("Serving MCP tool definitions.")
-    return JSONResponse(content=TOOLS_DEFINITIONS)
+    document = tools_document()
+    coding, body, etag = document.select(request.headers.get("accept-encoding"))
+    headers = {"ETag": etag, "Cache-Control": TOOLS_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if document.not_modified(request.headers.get("if-none-match")):
+        TOOLS_REQUESTS.inc("304", coding)
+        return Response(status_code=304, headers=headers)
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    TOOLS_REQUESTS.inc("200", coding)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# --- Tool Execution ---
+async def run_execute(session: McpSession, message_id: str, tool_name: str, tool_params: Dict[str, Any],
+                      deadline: Deadline, turn, span: Span):
+    """
+    Executes one 'execute' message as its own task and sends the correlated response.
+    Waiting for a concurrency slot and the tool call itself both count against `deadline`.
+    `turn` is a (previous, done) pair of futures in ordered mode, or None.
+    `span` is the message's span (current in this task); it is ended by McpSession.start.
+    """
+    session_id = session.session_id
+    previous = turn[0] if turn else None
+    label = tool_label(tool_name)
+    queued_at = time.perf_counter()
+    span.set_attribute("mcp.tool", tool_name)
+    queue_span = tracer.start_span("mcp.queue")
+    chunk_seq = 0
+    chunk_s = 0.0      # Time spent sending stream chunks, excluded from the upstream phase
+    serialize_s = 0.0  # Time spent encoding result frames
+
+    def encode(message: Dict[str, Any]) -> bytes:
+        nonlocal serialize_s
+        started = time.perf_counter()
+        frame = codec.dumps(message)
+        serialize_s += time.perf_counter() - started
+        return frame
+
+    async def send_chunk(result):
+        nonlocal chunk_seq, chunk_s
+        started = time.perf_counter()
+        # In ordered mode, a stream may only start once every earlier response has been sent
+        await session.wait_turn(previous)
+        frame = encode({"id": message_id, "type": "tool_result_chunk", "tool_name": tool_name, "seq": chunk_seq, "result": result})
+        await manager.send_personal_message(frame, session_id)
+        chunk_seq += 1
+        chunk_s += time.perf_counter() - started
+
+    async def execute_in_slot(tool: Tool):
+        async with session.semaphore:
+            TOOL_PHASE_SECONDS.observe(time.perf_counter() - queued_at, label, "queue")
+            queue_span.end()
+            logger.info("Executing tool '%s' for session %s", tool_name, session_id,
+                        extra={"category": "tool", "tool_name": tool_name, "payload": tool_params})
+            started = time.perf_counter()
+            try:
+                with tracer.span(f"tool.{label}"):
+                    return await tool(tool_params, send_chunk)
+            finally:
+                TOOL_PHASE_SECONDS.observe(time.perf_counter() - started - chunk_s, label, "upstream")
+
+    TOOL_CALLS_IN_FLIGHT.inc()
+    try:
+        # Lets the ServiceNow client size its connect/read timeouts to the remaining budget
+        # and charge its requests to this session's rate-limit bucket
+        current_deadline.set(deadline)
+        current_session_id.set(session_id)
+        current_message_id.set(message_id)
+        try:
+            # Unknown tools and invalid params are rejected before taking a slot or calling ServiceNow
+            tool = tool_registry.get(tool_name)
+            tool.validate(tool_params)
+            tool_result_payload = await asyncio.wait_for(execute_in_slot(tool), timeout=deadline.remaining())
+            response_message = {
+                "id": message_id,
+                "type": "tool_result",
+                "tool_name": tool_name,
+                "result": tool_result_payload
+            }
+        except (asyncio.TimeoutError, DeadlineExceeded) as e:
+            error_message = f"Tool '{tool_name}' did not complete within its {int(deadline.budget_s * 1000)} ms deadline."
+            logger.warning("%s Session: %s, message ID: %s. %s", error_message, session_id, message_id, e, extra={"tool_name": tool_name})
+            response_message = {"id": message_id, "type": "error", "error_type": "timeout", "error": error_message}
+        except UpstreamUnavailable as e:
+            error_message = f"ServiceNow is unavailable: {str(e)}"
+            logger.warning("%s Tool: '%s', session: %s", error_message, tool_name, session_id, extra={"tool_name": tool_name})
+            response_message = {"id": message_id, "type": "error", "error_type": "upstream_unavailable", "error": error_message}
+        except UnknownToolError as e:
+            logger.warning("%s", e)
+            response_message = {"id": message_id, "type": "error", "error_type": "unknown_tool", "error": str(e)}
+        except ValidationError as e:
+            error_message = f"Invalid params for tool '{tool_name}': {e}"
+            logger.warning("%s Session: %s", error_message, session_id, extra={"tool_name": tool_name, "payload": tool_params})
+            response_message = {"id": message_id, "type": "error", "error_type": "invalid_params", "error": error_message}
+        except Exception as e:
+            error_message = f"Error executing tool '{tool_name}': {str(e)}"
+            logger.error("%s", error_message, extra={"tool_name": tool_name})
+            response_message = {"id": message_id, "type": "error", "error_type": "tool_error", "error": error_message}
+
+        # In ordered mode, wait until every earlier response on this session has been sent. A call
+        # whose deadline expired while waiting still gets its timeout error, in its turn
+        await session.wait_turn(previous)
+        await manager.send_personal_message(encode(response_message), session_id)
+        TOOL_PHASE_SECONDS.observe(serialize_s, label, "serialize")
+        TOOL_CALLS.inc(label, response_message.get("error_type", "ok"))
+        span.set_attribute("mcp.outcome", response_message.get("error_type", "ok"))
+        logger.info("Sent response for message ID %s to session %s: %s", message_id, session_id, response_message["type"],
+                    extra={"category": "tool", "tool_name": tool_name})
+    except asyncio.CancelledError:
+        # Cancelled by a 'cancel' message or a disconnect: the agent no longer wants a result
+        logger.info("Cancelled message ID %s ('%s') for session %s", message_id, tool_name, session_id, extra={"tool_name": tool_name})
+        TOOL_CALLS.inc(label, "cancelled")
+        span.set_attribute("mcp.outcome", "cancelled")
+        raise
+    finally:
+        TOOL_CALLS_IN_FLIGHT.dec()
+        queue_span.end()  # No-op unless the call never got a slot
+        # The message span, the ordered-mode turn and session.tasks are released by McpSession.start
+
+def resolve_deadline(tool_name: str, mcp_message: Dict[str, Any]) -> Deadline:
+    """Builds the deadline for an 'execute' message from its 'deadline_ms' or the tool's default."""
+    deadline_ms = mcp_message.get("deadline_ms")
+    if deadline_ms is None:
+        deadline_ms = TOOL_DEFAULT_DEADLINES_MS.get(tool_name, DEFAULT_DEADLINE_MS)
+    elif isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0:
+        raise ValueError("'deadline_ms' must be a positive number of milliseconds.")
+    return Deadline.from_ms(min(deadline_ms, MAX_DEADLINE_MS))
 
 # --- WebSocket Endpoint for MCP Communication ---
 # This is where the AI agent will connect and send 'execute' requests.
+# Each 'execute' runs as its own task so pipelined requests are served concurrently;
+# responses are correlated by the message 'id'. A 'cancel' message naming that id
+# aborts the call. Connect with '/mcp?order=ordered' to receive responses in request
+# order instead of completion order.
 
-# --- Modify the WebSocket Endpoint to use the Manager ---
 @app.websocket("/mcp")
 async def websocket_endpoint(websocket: WebSocket):
     session_id = await manager.connect(websocket) # Connect and get the session_id
+    order = websocket.query_params.get("order", RESPONSE_ORDER)
+    session = McpSession(session_id, max_inflight=SESSION_MAX_INFLIGHT, ordered=(order == "ordered"))
+    # Tags every log record of this connection (and of the tasks it spawns) with the session
+    current_session_id.set(session_id)
     
     # Send a session_id message back to the client immediately upon connection
     # This is crucial for the client to know its session ID for subsequent messages.
@@ -196,113 +838,168 @@ async def websocket_endpoint(websocket: WebSocket):
         {"type": "session_id", "id": str(uuid.uuid4()), "session_id": session_id},
         session_id
     )
-    logger.info(f"Sent session_id {session_id} to client.")
+    logger.info("Sent session_id %s to client.", session_id)
 
     try:
         while True:
             raw_message = await websocket.receive_text()
-            logger.info(f"Received raw message from session {session_id}: {raw_message}")
+            received_ns = time.time_ns()
+            # Text frames arrive already decoded; their length in characters avoids re-encoding each one
+            WS_BYTES_RECEIVED.inc(amount=len(raw_message))
+            logger.info("Received raw message from session %s", session_id, extra={"category": "frame", "payload": raw_message})
 
             try:
-                mcp_message = json.loads(raw_message)
+                mcp_message = codec.loads(raw_message)
+                decoded_ns = time.time_ns()
                 message_type = mcp_message.get("type")
                 message_id = mcp_message.get("id", str(uuid.uuid4())) # Ensure message has an ID
+                MESSAGES_RECEIVED.inc(message_type if message_type in KNOWN_MESSAGE_TYPES else "other")
 
                 if not message_type:
-                    logger.warning(f"Received message without 'type' from session {session_id}: {mcp_message}")
+                    logger.warning("Received message without 'type' from session %s", session_id, extra={"payload": mcp_message})
                     await manager.send_personal_message({"id": message_id, "type": "error", "error": "Message type missing."}, session_id)
                     continue
 
-                logger.info(f"Received MCP message type: {message_type}, ID: {message_id}, Session: {session_id}")
-
-                # --- Handle MCP Heartbeat Messages ---
-                if message_type == "heartbeat":
-                    # Optionally, check for payload for specific heartbeat types
-                    await manager.send_personal_message(
-                        {"id": message_id, "type": "heartbeat_ack", "timestamp": mcp_message.get("timestamp")},
-                        session_id
-                    )
-                    logger.info(f"Sent heartbeat_ack for ID {message_id} to session {session_id}")
-                    continue # Process next message
-
-                elif message_type == "execute":
-                    tool_name = mcp_message.get("tool_name")
-                    tool_params = mcp_message.get("params", {})
-                    
-                    logger.info(f"Executing tool '{tool_name}' for session {session_id} with params: {tool_params}")
-
-                    tool_result_payload = {}
-                    error_message = None
-                    try:
-                        if tool_name == "get_incident_details":
-                            if not tool_params.get("incident_number") and not tool_params.get("sys_id"):
-                                raise ValueError("Either 'incident_number' or 'sys_id' must be provided for get_incident_details.")
-                            
-                            incident_data = sn_client.get_incident(
-                                incident_number=tool_params.get("incident_number"),
-                                sys_id=tool_params.get("sys_id")
+                logger.info("Received MCP message type: %s, ID: %s, Session: %s", message_type, message_id, session_id,
+                            extra={"category": message_type, "message_id": message_id})
+
+                # Spans the handling of this message, from the frame's arrival. An 'execute' span is
+                # ended by its task; the agent may continue its own trace via a 'traceparent' field.
+                span = tracer.start_span(
+                    f"mcp.{message_type}",
+                    traceparent=mcp_message.get("traceparent"),
+                    start_ns=received_ns,
+                    attributes={"mcp.session_id": session_id, "mcp.message_id": message_id}
+                )
+                tracer.start_span("mcp.decode", parent=span, start_ns=received_ns).end(decoded_ns)
+                handed_off = False
+                try:
+                    with tracer.use_span(span):
+                        # --- Handle MCP Heartbeat Messages ---
+                        if message_type == "heartbeat":
+                            # Optionally, check for payload for specific heartbeat types
+                            # Low priority: dropped rather than waited for when the agent is not keeping up
+                            await manager.send_personal_message(
+                                {"id": message_id, "type": "heartbeat_ack", "timestamp": mcp_message.get("timestamp")},
+                                session_id,
+                                priority=PRIORITY_LOW
+                            )
+                            logger.info("Sent heartbeat_ack for ID %s to session %s", message_id, session_id,
+                                        extra={"category": "heartbeat", "message_id": message_id})
+                            continue # Process next message
+
+                        elif message_type == "execute":
+                            if message_id in session.tasks:
+                                # Responses are correlated by id, so two in-flight calls cannot share one
+                                await manager.send_personal_message(
+                                    {"id": message_id, "type": "error", "error": f"Message ID '{message_id}' is already in flight."},
+                                    session_id
+                                )
+                                continue
+
+                            tool_name = mcp_message.get("tool_name")
+                            tool_params = mcp_message.get("params", {})
+                            try:
+                                # The budget starts now, so time spent queued behind other calls counts
+                                deadline = resolve_deadline(tool_name, mcp_message)
+                            except ValueError as e:
+                                await manager.send_personal_message({"id": message_id, "type": "error", "error": str(e)}, session_id)
+                                continue
+                            turn = session.next_turn() if session.ordered else None
+                            session.start(
+                                message_id, run_execute(session, message_id, tool_name, tool_params, deadline, turn, span),
+                                turn, span
                             )
-                            tool_result_payload = incident_data
-
-                        elif tool_name == "create_incident":
-                            required_params = ["short_description", "caller_id"]
-                            if not all(p in tool_params for p in required_params):
-                                raise ValueError(f"Missing required parameters for create_incident: {', '.join(required_params)}")
-
-                            new_incident_data = sn_client.create_incident(
-                                short_description=tool_params.get("short_description"),
-                                caller_id=tool_params.get("caller_id"),
-                                description=tool_params.get("description"),
-                                impact=tool_params.get("impact"),
-                                urgency=tool_params.get("urgency")
-                                # Pass other optional parameters dynamically
+                            handed_off = True
+
+                        # --- Handle MCP Cancel Messages ---
+                        # {"type": "cancel", "id": ..., "target_id": <id of an earlier 'execute'>}
+                        elif message_type == "cancel":
+                            target_id = mcp_message.get("target_id")
+                            if not target_id:
+                                await manager.send_personal_message(
+                                    {"id": message_id, "type": "error", "error": "'target_id' is required for cancel."},
+                                    session_id
+                                )
+                                continue
+                            cancelled = session.cancel(target_id)
+                            logger.info("Cancel for message ID %s from session %s: %s", target_id, session_id,
+                                        "cancelled" if cancelled else "not in flight", extra={"message_id": target_id})
+                            await manager.send_personal_message(
+                                {"id": message_id, "type": "cancel_ack", "target_id": target_id, "cancelled": cancelled},
+                                session_id
                             )
-                            tool_result_payload = new_incident_data
 
+                        # Add handlers for other MCP message types (e.g., 'feedback') if needed later
                         else:
-                            error_message = f"Unknown tool: '{tool_name}'"
-                            logger.warning(error_message)
-
-                    except Exception as e:
-                        error_message = f"Error executing tool '{tool_name}': {str(e)}"
-                        logger.error(error_message)
-
-                    # Prepare and send response (tool_result or error)
-                    if error_message:
-                        response_message = {
-                            "id": message_id,
-                            "type": "error",
-                            "error": error_message
-                        }
-                    else:
-                        response_message = {
-                            "id": message_id,
-                            "type": "tool_result",
-                            "tool_name": tool_name,
-                            "result": tool_result_payload
-                        }
-                    
-                    await manager.send_personal_message(response_message, session_id)
-                    logger.info(f"Sent response for message ID {message_id} to session {session_id}: {response_message['type']}")
-
-                # Add handlers for other MCP message types (e.g., 'cancel', 'feedback') if needed later
-                else:
-                    logger.warning(f"Received unhandled MCP message type: {message_type} from session {session_id}")
-                    await manager.send_personal_message({"id": message_id, "type": "error", "error": f"Unhandled message type: {message_type}"}, session_id)
+                            logger.warning("Received unhandled MCP message type: %s from session %s", message_type, session_id)
+                            await manager.send_personal_message({"id": message_id, "type": "error", "error": f"Unhandled message type: {message_type}"}, session_id)
+                finally:
+                    if not handed_off:
+                        span.end()
 
             except json.JSONDecodeError:
-                logger.error(f"Received invalid JSON from session {session_id}: {raw_message}")
+                MESSAGES_RECEIVED.inc("invalid")
+                logger.error("Received invalid JSON from session %s", session_id, extra={"payload": raw_message})
                 await manager.send_personal_message({"type": "error", "error": "Invalid JSON received."}, session_id)
             except Exception as e:
-                logger.error(f"An unexpected error occurred in WebSocket handler for session {session_id}: {e}", exc_info=True)
+                logger.error("An unexpected error occurred in WebSocket handler for session %s: %s", session_id, e, exc_info=True)
                 await manager.send_personal_message({"type": "error", "error": f"Internal server error: {str(e)}"}, session_id)
 
     except WebSocketDisconnect:
-        manager.disconnect(session_id) # Disconnect using the session ID
+        pass  # Cleaned up below
     except Exception as e:
-        logger.error(f"WebSocket connection error for session {session_id}: {e}", exc_info=True)
+        logger.error("WebSocket connection error for session %s: %s", session_id, e, exc_info=True)
+    finally:
+        # Nobody is left to receive results: stop paying for the upstream work
+        tasks = list(session.tasks.values())
+        cancelled = session.cancel_all()
+        if cancelled:
+            logger.info("Cancelled %d in-flight call(s) for closed session %s", cancelled, session_id)
+        try:
+            await manager.disconnect(session_id)
+            # Let cancelled calls unwind first: a call cancelled while waiting refunds its token
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            # However the connection ended, release its rate-limit bucket (a row when state is shared)
+            await sn_client.drop_session(session_id)
+
+# --- Prometheus Metrics ---
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
 
 # --- Health Check (Optional but Recommended) ---
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "message": "ServiceNow MCP Server is running."}
+    breaker = sn_client.circuit_breaker.stats()
+    return {
+        "status": "ok" if breaker["state"] == "closed" else "degraded",
+        "message": "ServiceNow MCP Server is running.",
+        "sessions": {
+            "state_backend": get_state_backend().kind,
+            "worker_pid": os.getpid(),
+            "active": len(manager.active_connections),
+            "per_worker": manager.session_registry.per_worker()
+        },
+        "circuit_breaker": breaker,
+        "upstream_pool": sn_client.pool_stats(),
+        "incident_cache": sn_client.cache.stats(),
+        "coalescing": sn_client.single_flight.stats(),
+        "lookups": sn_client.lookup_stats(),
+        "retries": sn_client.retry_policy.stats(),
+        "rate_limiter": sn_client.rate_limiter.stats(),
+        "outbound": manager.outbound_stats(),
+        "logging": log_pipeline.stats()
+    }
+
+# --- Entry Point ---
+# `python main.py` serves one process with the tuned permessage-deflate protocol. With several
+# workers, use `uvicorn main:app --workers N --ws ws_compression:DeflateWebSocketProtocol`.
+if __name__ == "__main__":
+    import uvicorn
+    from ws_compression import DeflateWebSocketProtocol
+
+    uvicorn.run(app, host=os.getenv("MCP_HOST", "0.0.0.0"), port=int(os.getenv("MCP_PORT", "8000")),
+                ws=DeflateWebSocketProtocol)
@@ -0,0 +1,189 @@
+# metrics.py
+# Minimal Prometheus instrumentation without a client library.
+# Counters, gauges and histograms are sharded per thread: each thread only ever writes its
+# own shard, so recording a value takes no lock; a scrape sums the shards.
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _label_key(item) -> tuple:
+    # Orders samples by label values as rendered, so mixed value types (200, "timeout") still sort
+    return tuple(map(str, item[0]))
+
+
+class _Sharded:
+    """Base for metrics whose samples live in per-thread dicts keyed by label values."""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # list.append is atomic, so registering a shard needs no lock
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            self._shards.append(shard)
+            return shard
+
+    def _snapshots(self):
+        # dict.copy() runs without releasing the GIL, so a writer cannot resize the dict mid-copy
+        return [shard.copy() for shard in list(self._shards)]
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Sharded):
+    """Monotonic count, e.g. messages received per type."""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> dict:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def collect(self) -> list:
+        lines = self.header()
+        for labels, value in sorted(self.values().items(), key=_label_key):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. tool calls in flight. Shards hold per-thread deltas."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Sharded):
+    """Distribution of observed values (seconds) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # Per-bucket counts (last slot is +Inf), then sum and count
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def collect(self) -> list:
+        merged = {}
+        for shard in self._snapshots():
+            for labels, series in shard.items():
+                series = list(series)
+                total = merged.get(labels)
+                merged[labels] = series if total is None else [a + b for a, b in zip(total, series)]
+
+        lines = self.header()
+        for labels, series in sorted(merged.items(), key=_label_key):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_str} {series[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Metric read at scrape time from state that is already tracked elsewhere (pool, cache, breaker).
+    `fn` returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name: str, documentation: str, fn, kind: str = "gauge", labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        value = self.fn()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(sample)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn, kind: str = "gauge", labelnames: tuple = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, fn, kind, labelnames))
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served at /metrics
+registry = Registry()
+
+# Content type of Registry.render() output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,167 @@
+# outbound_queue.py
+# Per-session outbound queue with its own writer task, so producers (tool calls, the receive
+# loop) hand off encoded frames instead of awaiting the socket themselves, and a slow-reading
+# agent cannot make the server buffer without limit.
+#
+# The queue is bounded by message count and by bytes. What happens when a frame does not fit
+# is the slow-consumer policy:
+#   pause       The producer waits for room. A streaming tool stops fetching upstream pages
+#               until the agent catches up.
+#   drop        Low-priority frames (e.g. heartbeat acks) are dropped; others wait as in pause.
+#   disconnect  The session is closed (code 1013, "try again later").
+# A producer that has waited `stall_timeout_s` for room closes the session the same way.
+#
+# Only the writer task awaits the socket. uvicorn's send suspends while the transport is
+# paused, so a producer writing for itself (the receive loop included) would stall there
+# with neither the stall timeout nor the drop policy applying to it.
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_LOW = 0     # May be dropped under the "drop" policy
+PRIORITY_NORMAL = 1
+
+SLOW_CONSUMER_POLICIES = ("pause", "drop", "disconnect")
+
+# WebSocket close code sent to a session closed as a slow consumer
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class OutboundQueue:
+    """
+    FIFO of encoded frames for one session, drained by a writer task calling `send(frame, context)`,
+    where `context` is whatever the producer passed to put() (e.g. its trace span).
+    `close(code, reason)` is awaited to close the connection of a slow consumer.
+    `on_event(action)` is called with "paused", "dropped" or "disconnected".
+    """
+
+    def __init__(self, send, close, max_messages: int = 256, max_bytes: int = 8 * 1024 * 1024,
+                 policy: str = "drop", stall_timeout_s: float = 30.0, on_event=None):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: '{policy}'")
+        self._send = send
+        self._close = close
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.stall_timeout_s = stall_timeout_s
+        self._on_event = on_event
+        self._items = deque()
+        self.bytes = 0          # Bytes queued, including the frame being written
+        self.sent = 0
+        self.dropped = 0
+        self.paused = 0         # Producers currently waiting for room
+        self.closed = False
+        self._not_empty = asyncio.Event()
+        self._space = asyncio.Event()
+        self._writer = None
+
+    def start(self):
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _fits(self, size: int) -> bool:
+        # A frame larger than max_bytes is still let through once the queue has drained
+        if not self._items:
+            return True
+        return len(self._items) < self.max_messages and self.bytes + size <= self.max_bytes
+
+    async def put(self, frame: bytes, priority: int = PRIORITY_NORMAL, context=None) -> bool:
+        """
+        Queues `frame`, waiting for room if the policy says so.
+        Returns False if the frame was dropped or the session is (now) closed.
+        """
+        if self.closed:
+            return False
+        if not self._fits(len(frame)):
+            if self.policy == "disconnect":
+                await self.abort("slow consumer: outbound queue full")
+                return False
+            if self.policy == "drop" and priority <= PRIORITY_LOW:
+                self.dropped += 1
+                self._event("dropped")
+                return False
+            if not await self._wait_for_space(len(frame)):
+                return False
+        self._items.append((frame, context))
+        self.bytes += len(frame)
+        self._not_empty.set()
+        return True
+
+    async def _wait_for_space(self, size: int) -> bool:
+        self.paused += 1
+        self._event("paused")
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.stall_timeout_s if self.stall_timeout_s > 0 else None
+        try:
+            while not self._fits(size):
+                if self.closed:
+                    return False
+                self._space.clear()
+                if give_up_at is None:
+                    await self._space.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self._space.wait(), timeout=max(give_up_at - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    await self.abort(f"slow consumer: no progress for {self.stall_timeout_s:g}s")
+                    return False
+            return not self.closed
+        finally:
+            self.paused -= 1
+
+    async def _run(self):
+        while True:
+            while not self._items:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            frame, context = self._items.popleft()
+            # A slot frees up now; the frame's bytes stay counted until it is written
+            self._space.set()
+            try:
+                await self._send(frame, context)
+            except Exception as e:
+                # The peer is gone; the receive loop will notice and clean the session up
+                logger.warning("Failed to write outbound frame: %s", e)
+                self.discard()
+                return
+            if not self.closed:
+                self.bytes -= len(frame)
+            self.sent += 1
+            self._space.set()
+
+    def discard(self):
+        """Drops everything queued and stops the writer. Waiting producers return False."""
+        if self.closed:
+            return
+        self.closed = True
+        self._items.clear()
+        self.bytes = 0
+        self._space.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def abort(self, reason: str):
+        """Discards the queue and closes the connection of a slow consumer."""
+        if self.closed:
+            return
+        logger.warning("Closing session with %d queued frame(s) (%d bytes): %s", len(self._items), self.bytes, reason)
+        self.discard()
+        self._event("disconnected")
+        try:
+            await self._close(SLOW_CONSUMER_CLOSE_CODE, reason[:120])
+        except Exception as e:
+            logger.warning("Failed to close slow consumer: %s", e)
+
+    def _event(self, action: str):
+        if self._on_event is not None:
+            self._on_event(action)
+
+    def stats(self) -> dict:
+        return {"depth": len(self._items), "bytes": self.bytes, "sent": self.sent, "dropped": self.dropped,
+                "paused": self.paused, "policy": self.policy}
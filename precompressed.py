@@ -0,0 +1,92 @@
+# precompressed.py
+# A response body encoded once and kept in every content coding the server offers
+# (identity, gzip and, if the brotli package is installed, br), with a strong ETag per coding.
+# Serving it is a header parse and a dict lookup: nothing is serialized or compressed per request.
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+# Codings tried in this order when the client accepts several equally
+PREFERRED_ENCODINGS = ("br", "gzip", "identity")
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Maps each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class PrecompressedBody:
+    """
+    `data` plus its compressed variants. Variants that do not come out smaller than `data`
+    are not kept. A body smaller than `min_size` bytes is only kept as identity.
+    """
+
+    def __init__(self, data: bytes, gzip_level: int = 9, brotli_quality: int = 11, min_size: int = 256):
+        self.data = data
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        # Strong ETags identify one exact byte sequence, so each coding gets its own
+        self.variants = {"identity": (data, f'"{digest}"')}
+        if len(data) >= min_size:
+            # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts and workers
+            candidates = {"gzip": gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=brotli_quality)
+            for coding, body in candidates.items():
+                if len(body) < len(data):
+                    self.variants[coding] = (body, f'"{digest}-{coding}"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def select(self, accept_encoding: str) -> tuple:
+        """Returns (coding, body, etag) for the best variant allowed by an Accept-Encoding header."""
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*")
+        best = None
+        for coding in PREFERRED_ENCODINGS:
+            if coding not in self.variants:
+                continue
+            q = accepted.get(coding, wildcard)
+            if q is None:
+                # identity is acceptable unless refused explicitly
+                q = 1.0 if coding == "identity" else 0.0
+            if q > 0 and (best is None or q > best[1]):
+                best = (coding, q)
+        coding = best[0] if best else "identity"
+        body, etag = self.variants[coding]
+        return coding, body, etag
+
+    def not_modified(self, if_none_match: str) -> bool:
+        """
+        True if an If-None-Match header names any variant of this body. The comparison is weak
+        (RFC 9110), so W/"..." also matches, and a validator from any coding means the client
+        already holds the current content.
+        """
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
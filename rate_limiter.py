@@ -0,0 +1,125 @@
+# rate_limiter.py
+import os
+import threading
+import time
+
+from call_context import DeadlineExceeded
+
+
+class RateLimited(DeadlineExceeded):
+    """Raised when the wait for rate-limit tokens would outlast the call's deadline."""
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations instead of refusing: a caller that finds the
+    bucket empty still takes a token (driving the balance negative) and is told how long
+    to wait for it. Later callers queue behind it, so waiting is first come, first served.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token reserved now would be available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class RateLimiter:
+    """
+    Client-side limit on requests to ServiceNow, shared by every session of the process.
+    A global bucket protects the integration user's quota; a per-session sub-bucket keeps
+    one chatty session from using all of it. Callers wait for tokens rather than fail,
+    unless the wait would outlast their deadline.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None, session_rate: float = None, session_burst: float = None):
+        self.rate = rate if rate is not None else float(os.getenv("SERVICENOW_RATE_LIMIT_PER_S", "25"))
+        self.burst = burst or float(os.getenv("SERVICENOW_RATE_LIMIT_BURST", "50"))
+        self.session_rate = session_rate if session_rate is not None else float(os.getenv("SERVICENOW_SESSION_RATE_LIMIT_PER_S", "10"))
+        self.session_burst = session_burst or float(os.getenv("SERVICENOW_SESSION_RATE_LIMIT_BURST", "20"))
+        self._global = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+        # Key: session_id, Value: TokenBucket
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.waits = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.rejected = 0
+
+    def _buckets(self, session_id: str) -> list:
+        # Caller holds the lock
+        buckets = [self._global] if self._global else []
+        if session_id and self.session_rate > 0:
+            bucket = self._sessions.get(session_id)
+            if bucket is None:
+                bucket = self._sessions[session_id] = TokenBucket(self.session_rate, self.session_burst)
+            buckets.append(bucket)
+        return buckets
+
+    def reserve(self, session_id: str = None, max_wait_s: float = None) -> float:
+        """
+        Reserves one request and returns how many seconds the caller must wait before sending it.
+        Raises RateLimited, reserving nothing, if that wait would exceed max_wait_s.
+        """
+        with self._lock:
+            now = time.monotonic()
+            buckets = self._buckets(session_id)
+            wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+            self._check_wait(wait, max_wait_s)
+            for bucket in buckets:
+                bucket.take()
+            self._record_wait(wait)
+            return wait
+
+    def _check_wait(self, wait: float, max_wait_s: float):
+        # Caller holds the lock
+        if max_wait_s is not None and wait > max_wait_s:
+            self.rejected += 1
+            raise RateLimited(f"Rate limit wait of {wait:.2f}s exceeds the remaining {max_wait_s:.2f}s budget.")
+
+    def _record_wait(self, wait: float):
+        # Caller holds the lock
+        if wait > 0:
+            self.waits += 1
+            self.total_wait_s += wait
+            self.max_wait_s = max(self.max_wait_s, wait)
+
+    def refund(self, session_id: str = None):
+        """Returns a reservation that was never used (e.g. the caller was cancelled while waiting)."""
+        with self._lock:
+            for bucket in self._buckets(session_id):
+                bucket.refund()
+
+    def drop_session(self, session_id: str):
+        """Forgets the sub-bucket of a session that has disconnected."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "waits": self.waits,
+            "total_wait_s": round(self.total_wait_s, 3),
+            "avg_wait_s": round(self.total_wait_s / self.waits, 4) if self.waits else 0.0,
+            "max_wait_s": round(self.max_wait_s, 3),
+            "rejected": self.rejected,
+            "sessions": len(self._sessions),
+        }
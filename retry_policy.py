@@ -0,0 +1,146 @@
+# retry_policy.py
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Methods that can be repeated without changing the outcome
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Responses worth retrying: rate limiting and transient gateway / availability errors
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# Failure kinds reported by the clients for requests that produced no HTTP response
+CONNECT_FAILURE = "connect"      # Never reached ServiceNow; safe to resend any request
+TIMEOUT_FAILURE = "timeout"      # Sent, but no response in time
+TRANSPORT_FAILURE = "transport"  # Connection broke after the request may have been sent
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent traffic so retries cannot multiply load on an
+    instance that is already struggling. Traffic is counted in one-second buckets over
+    a sliding window; `min_per_s` retries per second are always allowed.
+    """
+
+    def __init__(self, ratio: float = None, min_per_s: float = None, window_s: int = 10):
+        self.ratio = ratio if ratio is not None else float(os.getenv("SERVICENOW_RETRY_BUDGET_RATIO", "0.2"))
+        self.min_per_s = min_per_s if min_per_s is not None else float(os.getenv("SERVICENOW_RETRY_BUDGET_MIN_PER_S", "1"))
+        self.window_s = window_s
+        # One [second, requests, retries] bucket per slot of the window
+        self._buckets = [[0, 0, 0] for _ in range(window_s)]
+        self._lock = threading.Lock()
+
+    def _bucket(self, now: int):
+        bucket = self._buckets[now % self.window_s]
+        if bucket[0] != now:
+            bucket[0], bucket[1], bucket[2] = now, 0, 0
+        return bucket
+
+    def _totals(self, now: int):
+        requests = retries = 0
+        for second, bucket_requests, bucket_retries in self._buckets:
+            if now - second < self.window_s:
+                requests += bucket_requests
+                retries += bucket_retries
+        return requests, retries
+
+    def record_request(self):
+        with self._lock:
+            self._bucket(int(time.monotonic()))[1] += 1
+
+    def try_spend(self) -> bool:
+        """Reserves one retry if the budget allows it."""
+        with self._lock:
+            now = int(time.monotonic())
+            requests, retries = self._totals(now)
+            if retries >= requests * self.ratio + self.min_per_s * self.window_s:
+                return False
+            self._bucket(now)[2] += 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed ServiceNow request is retried.
+    Reads (idempotent methods) are retried on retryable statuses, timeouts and broken
+    connections. Writes are only retried when they provably did not take effect: a 429
+    rejection, a failed connect, or when the caller vouches for idempotency.
+    Delays use exponential backoff with full jitter, or the server's Retry-After.
+    """
+
+    def __init__(self, max_attempts: int = None, base_delay_s: float = None, max_delay_s: float = None,
+                 budget: RetryBudget = None):
+        self.max_attempts = max_attempts or int(os.getenv("SERVICENOW_RETRY_MAX_ATTEMPTS", "3"))
+        self.base_delay_s = base_delay_s or float(os.getenv("SERVICENOW_RETRY_BASE_DELAY_S", "0.2"))
+        self.max_delay_s = max_delay_s or float(os.getenv("SERVICENOW_RETRY_MAX_DELAY_S", "5"))
+        self.budget = budget or RetryBudget()
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.gave_up = 0
+        # Key: status code (or failure kind), Value: retries caused by it
+        self.retries_by_status = {}
+
+    @staticmethod
+    def parse_retry_after(value: str):
+        """Returns the Retry-After delay in seconds (delta-seconds or HTTP-date), or None."""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * (2 ** attempt)))
+
+    def _retryable(self, method: str, status: int, failure: str, idempotent: bool) -> bool:
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        if status is not None:
+            return status in RETRYABLE_STATUSES and (idempotent or status == 429)
+        if failure == CONNECT_FAILURE:
+            return True
+        return failure in (TIMEOUT_FAILURE, TRANSPORT_FAILURE) and idempotent
+
+    def retry_delay(self, method: str, attempt: int, status: int = None, retry_after: str = None,
+                    failure: str = None, idempotent: bool = None, time_left: float = None):
+        """
+        Returns how long to wait before retrying a failed attempt (0-based), or None to give up.
+        `time_left` is the remaining deadline budget; a retry that cannot finish in time is not made.
+        """
+        if not self._retryable(method, status, failure, idempotent):
+            return None
+        if attempt + 1 >= self.max_attempts:
+            self.gave_up += 1
+            return None
+
+        delay = self.parse_retry_after(retry_after) if status in (429, 503) else None
+        if delay is None:
+            delay = self.backoff(attempt)
+        elif delay > self.max_delay_s:
+            self.gave_up += 1
+            return None
+        if time_left is not None and delay >= time_left:
+            self.gave_up += 1
+            return None
+
+        if not self.budget.try_spend():
+            self.budget_exhausted += 1
+            return None
+        self.retries += 1
+        key = str(status) if status is not None else failure
+        self.retries_by_status[key] = self.retries_by_status.get(key, 0) + 1
+        return delay
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "retries_by_status": dict(self.retries_by_status),
+            "budget_exhausted": self.budget_exhausted,
+            "gave_up": self.gave_up,
+        }
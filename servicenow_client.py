@@ -1,69 +1,740 @@
 # servicenow_client.py
+import asyncio
+import base64
+import contextvars
 import requests
+import httpx
+import logging
 import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from codec import codec
+from call_context import DeadlineExceeded, current_deadline, current_session_id
+from singleflight import AsyncSingleFlight, SingleFlight
+from circuit_breaker import CircuitBreaker, UpstreamUnavailable
+from state_backend import StateBackend, get_state_backend
+from retry_policy import CONNECT_FAILURE, TIMEOUT_FAILURE, TRANSPORT_FAILURE, RetryPolicy
+from metrics import registry
+from tracing import tracer
 
 # Load environment variables from .env file
 load_dotenv()
 
-class ServiceNowClient:
-    def __init__(self):
+logger = logging.getLogger(__name__)
+
+# --- Upstream metrics (shared by every client in the process) ---
+UPSTREAM_REQUESTS = registry.counter(
+    "servicenow_requests_total", "Requests sent to ServiceNow, by method and HTTP status (or 'timeout'/'error').",
+    ("method", "status"))
+UPSTREAM_DURATION = registry.histogram(
+    "servicenow_request_duration_seconds", "Duration of single request attempts to ServiceNow.", ("method",))
+UPSTREAM_BYTES_IN = registry.counter(
+    "servicenow_response_bytes_total", "Bytes of response bodies received from ServiceNow.")
+
+# How an incident lookup is sent upstream.
+# path: "sys_id" (direct record endpoint) or "number" (single-row filtered query).
+# expect_number: when both keys were given, the number the fetched record must carry.
+LookupPlan = namedtuple("LookupPlan", ["path", "endpoint", "params", "expect_number"])
+
+# ServiceNow Batch API, used to pack many incident creates into one HTTP request
+BATCH_API_PATH = "/api/now/v1/batch"
+# Status codes on the batch request itself that mean the Batch API is not usable here
+BATCH_API_UNAVAILABLE_STATUSES = {403, 404, 405, 501}
+
+# Named sysparm_fields projections for incident lookups. None returns the full record.
+INCIDENT_FIELD_PROFILES = {
+    "full": None,
+    "summary": [
+        "number", "sys_id", "short_description", "state", "priority", "impact", "urgency",
+        "assigned_to", "assignment_group", "caller_id", "opened_at", "sys_updated_on",
+    ],
+}
+
+class _BaseServiceNowClient:
+    """Configuration and request building shared by the sync and async clients."""
+
+    def __init__(self, pool_size: int = None, pool_max_per_host: int = None, pool_keepalive_s: float = None,
+                 state_backend: StateBackend = None):
         self.instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
         self.username = os.getenv("SERVICENOW_USERNAME")
         self.password = os.getenv("SERVICENOW_PASSWORD")
         self.base_api_url = f"{self.instance_url}/api/now/table"
         self.headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        # Header carrying the trace id of each request, for joining with instance logs
+        self.correlation_header = os.getenv("SERVICENOW_CORRELATION_HEADER", "X-Correlation-ID")
 
         if not all([self.instance_url, self.username, self.password]):
             raise ValueError("ServiceNow credentials (URL, username, password) are not set in .env")
 
-    def _make_request(self, method, endpoint, data=None, params=None):
-        """Helper to make authenticated requests to ServiceNow API."""
-        url = f"{self.base_api_url}/{endpoint}"
+        # Connection pool settings: total connections, connections per host and how long
+        # an idle keep-alive connection may sit in the pool before it is evicted.
+        self.pool_size = pool_size or int(os.getenv("SERVICENOW_POOL_SIZE", "20"))
+        self.pool_max_per_host = pool_max_per_host or int(os.getenv("SERVICENOW_POOL_MAX_PER_HOST", "10"))
+        self.pool_keepalive_s = pool_keepalive_s or float(os.getenv("SERVICENOW_POOL_KEEPALIVE_S", "30"))
+        self._pool_counters = {"requests": 0, "created": 0, "in_use": 0}
+
+        # Upper bounds for connecting to and waiting on ServiceNow. A tool call's deadline
+        # shortens them further to whatever budget it has left.
+        self.connect_timeout_s = float(os.getenv("SERVICENOW_CONNECT_TIMEOUT_S", "5"))
+        self.read_timeout_s = float(os.getenv("SERVICENOW_READ_TIMEOUT_S", "30"))
+
+        # Retries of failed upstream requests (backoff, Retry-After, retry budget)
+        self.retry_policy = RetryPolicy()
+
+        # Rate-limit buckets and cached incidents live in the process, or are shared by all
+        # worker processes on the host (MCP_STATE_BACKEND=sqlite)
+        state_backend = state_backend or get_state_backend()
+        self.shared_state = state_backend.state is not None
+
+        # Keeps this process within the integration user's REST quota. Calls without a
+        # deadline wait at most rate_limit_max_wait_s for a token.
+        self.rate_limiter = state_backend.rate_limiter()
+        self.rate_limit_max_wait_s = float(os.getenv("SERVICENOW_RATE_LIMIT_MAX_WAIT_S", "30"))
+
+        # Fails fast while ServiceNow is failing or too slow
+        self.circuit_breaker = CircuitBreaker()
+        self.breaker_serve_stale = os.getenv("SERVICENOW_BREAKER_SERVE_STALE", "true").lower() == "true"
+
+        # Read-through cache for get_incident, invalidated by every write path
+        self.cache = state_backend.incident_cache()
+
+        # Upstream lookup latency per LookupPlan path
+        self._lookup_stats = {
+            path: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "not_found": 0, "errors": 0}
+            for path in ("sys_id", "number", "batch")
+        }
+
+        # Batch lookups: keys per encoded IN query, and the most keys one call may ask for
+        self.batch_chunk_size = int(os.getenv("SERVICENOW_BATCH_CHUNK_SIZE", "100"))
+        self.batch_max_keys = int(os.getenv("SERVICENOW_BATCH_MAX_KEYS", "500"))
+
+        # Bulk creation: creates per Batch API request, and parallel POSTs when falling back
+        self.bulk_batch_size = int(os.getenv("SERVICENOW_BULK_BATCH_SIZE", "50"))
+        self.bulk_fallback_concurrency = int(os.getenv("SERVICENOW_BULK_FALLBACK_CONCURRENCY", "4"))
+        self._batch_api_available = True
+
+        # Paged queries: default and largest sysparm_limit per page
+        self.query_page_size = int(os.getenv("SERVICENOW_QUERY_PAGE_SIZE", "100"))
+        self.query_max_page_size = int(os.getenv("SERVICENOW_QUERY_MAX_PAGE_SIZE", "1000"))
+
+        # Projection applied to lookups that do not ask for specific fields
+        self.default_field_profile = os.getenv("SERVICENOW_INCIDENT_FIELD_PROFILE", "full")
+        if self.default_field_profile not in INCIDENT_FIELD_PROFILES:
+            raise ValueError(f"Unknown SERVICENOW_INCIDENT_FIELD_PROFILE: '{self.default_field_profile}'")
+
+    def _url(self, endpoint: str) -> str:
+        """Table API endpoints are relative to base_api_url; paths starting with '/' to the instance."""
+        if endpoint.startswith("/"):
+            return f"{self.instance_url}{endpoint}"
+        return f"{self.base_api_url}/{endpoint}"
+
+    def _timeouts(self):
+        """
+        Returns (connect, read) timeouts for the next upstream request, capped by the
+        remaining budget of the current call's deadline. Raises DeadlineExceeded if none is left.
+        """
+        deadline = current_deadline.get()
+        if deadline is None:
+            return self.connect_timeout_s, self.read_timeout_s
+        deadline.check()
+        remaining = deadline.remaining()
+        return min(self.connect_timeout_s, remaining), min(self.read_timeout_s, remaining)
+
+    def _classify_failure(self, error: Exception):
+        """
+        Describes a failed attempt for the retry policy as (status, retry_after, failure kind).
+        Returns None for errors that are not upstream failures (e.g. an expired deadline).
+        """
+        raise NotImplementedError
+
+    def _reserve_rate_limit(self) -> float:
+        """Reserves a rate-limit token for the current session and returns the wait before sending."""
+        deadline = current_deadline.get()
+        max_wait = deadline.remaining() if deadline is not None else self.rate_limit_max_wait_s
+        return self.rate_limiter.reserve(current_session_id.get(), max_wait)
+
+    def _record_breaker_outcome(self, error: BaseException, started: float):
+        """Feeds a failed attempt to the circuit breaker. Client errors (4xx other than 429) count as healthy."""
+        failure = self._classify_failure(error) if isinstance(error, Exception) else None
+        if failure is None:
+            # Expired deadline before sending, cancellation, ...: says nothing about ServiceNow
+            self.circuit_breaker.record_ignored()
+            return
+        status, _, _ = failure
+        duration = time.perf_counter() - started
+        if status is None or status >= 500:
+            self.circuit_breaker.record_failure(duration)
+        else:
+            self.circuit_breaker.record_success(duration)
+
+    def _start_attempt_span(self):
+        """Starts the span of one request attempt; returns it with the headers that propagate it."""
+        span = tracer.start_span("servicenow.attempt")
+        # The correlation id (the trace id) lets instance-side logs be joined with our traces
+        return span, {"traceparent": span.traceparent, self.correlation_header: span.trace_id}
+
+    def _record_upstream(self, method: str, status, started: float, span):
+        # Label values are strings: the HTTP code, "timeout" or "error"
+        UPSTREAM_REQUESTS.inc(method, str(status))
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, method)
+        span.set_attribute("http.status_code", status)
+        span.end()
+
+    def _serve_stale(self, error: UpstreamUnavailable, incident_number: str, sys_id: str, fields: tuple) -> dict:
+        """While the breaker is open, answers a lookup from an expired cache entry if one is kept."""
+        stale = self.cache.get_stale(incident_number, sys_id, fields) if self.breaker_serve_stale else None
+        if stale is None:
+            raise error
+        logger.warning("Circuit open; serving stale cached incident %s.", stale.get("number") or stale.get("sys_id"))
+        return stale
+
+    def _retry_delay(self, method: str, attempt: int, error: Exception, idempotent: bool):
+        """Returns the delay before retrying after `error`, or None if it must not be retried."""
+        failure = self._classify_failure(error)
+        if failure is None:
+            return None
+        status, retry_after, kind = failure
+        deadline = current_deadline.get()
+        return self.retry_policy.retry_delay(
+            method, attempt, status=status, retry_after=retry_after, failure=kind, idempotent=idempotent,
+            time_left=deadline.remaining() if deadline is not None else None
+        )
+
+    def _idle_connections(self) -> int:
+        """Number of open connections currently parked in the pool."""
+        raise NotImplementedError
+
+    def pool_stats(self) -> dict:
+        """Returns connection pool usage: in-use, idle, created and reused connections."""
+        counters = self._pool_counters
+        return {
+            "in_use": counters["in_use"],
+            "idle": self._idle_connections(),
+            "created": counters["created"],
+            "reused": max(counters["requests"] - counters["created"], 0),
+            "requests": counters["requests"],
+        }
+
+    def _resolve_fields(self, fields: list = None, field_profile: str = None):
+        """
+        Returns the projection for a lookup as a sorted tuple, or None for the full record.
+        Explicit fields win over a profile; the server default profile applies otherwise.
+        number and sys_id are always included so the result can be cached and correlated.
+        """
+        if not fields:
+            profile = field_profile or self.default_field_profile
+            if profile not in INCIDENT_FIELD_PROFILES:
+                raise ValueError(f"Unknown field profile: '{profile}'")
+            fields = INCIDENT_FIELD_PROFILES[profile]
+            if fields is None:
+                return None
+        return tuple(sorted(set(fields) | {"number", "sys_id"}))
+
+    def _plan_incident_lookup(self, incident_number: str = None, sys_id: str = None, fields: tuple = None) -> LookupPlan:
+        """
+        Chooses the cheapest Table API call for an incident lookup.
+        A sys_id goes to the direct /incident/{sys_id} record endpoint rather than a filtered
+        table query. A number is a filtered query bounded to one row with the total count skipped.
+        """
+        if not incident_number and not sys_id:
+            raise ValueError("Either incident_number or sys_id must be provided to get an incident.")
+
+        params = {}
+        if fields:
+            params['sysparm_fields'] = ",".join(fields)
+        if sys_id:
+            return LookupPlan("sys_id", f"incident/{quote(sys_id, safe='')}", params, incident_number)
+
+        params['number'] = incident_number
+        params['sysparm_limit'] = "1"
+        params['sysparm_no_count'] = "true"
+        return LookupPlan("number", "incident", params, None)
+
+    def _plan_result(self, plan: LookupPlan, response: dict) -> dict:
+        """Extracts the incident from a lookup response, or {} if there is none."""
+        if plan.path == "sys_id":
+            # The record endpoint returns a single object; None means it answered 404
+            incident = (response or {}).get('result') or {}
+            if plan.expect_number and incident.get('number') != plan.expect_number:
+                return {}
+            return incident
+        return self._first_result(response)
+
+    def _record_lookup(self, path: str, started: float, found: bool, failed: bool = False):
+        """Adds one lookup to the latency counters of its path."""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self._lookup_stats[path]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if failed:
+            stats["errors"] += 1
+        elif not found:
+            stats["not_found"] += 1
+
+    def lookup_stats(self) -> dict:
+        """Returns upstream lookup counts and latencies (ms) per lookup path."""
+        return {
+            path: dict(
+                stats,
+                total_ms=round(stats["total_ms"], 3),
+                max_ms=round(stats["max_ms"], 3),
+                avg_ms=round(stats["total_ms"] / stats["count"], 3) if stats["count"] else 0.0,
+            )
+            for path, stats in self._lookup_stats.items()
+        }
+
+    def _plan_batch_lookup(self, numbers: list, sys_ids: list, fields: tuple, bypass_cache: bool):
+        """
+        Prepares a batch lookup. Keys found in the incident cache are served directly; the rest
+        are split into chunks of `numberIN...` / `sys_idIN...` encoded queries.
+        Returns (found, chunks, numbers, sys_ids): found maps sys_id -> record, chunks are
+        (plan, key_count) pairs and numbers / sys_ids are the de-duplicated keys.
+        """
+        numbers = list(dict.fromkeys(numbers or []))
+        sys_ids = list(dict.fromkeys(sys_ids or []))
+        if not numbers and not sys_ids:
+            raise ValueError("At least one incident number or sys_id must be provided to get incidents.")
+        if len(numbers) + len(sys_ids) > self.batch_max_keys:
+            raise ValueError(f"A batch lookup may request at most {self.batch_max_keys} incidents.")
+        for key in numbers + sys_ids:
+            # Keys are spliced into an encoded query, so reject its separators
+            if not isinstance(key, str) or not key or "," in key or "^" in key:
+                raise ValueError(f"Invalid incident key for batch lookup: {key!r}")
+
+        found = {}
+        chunks = []
+        for key_field, keys in (("number", numbers), ("sys_id", sys_ids)):
+            missing = []
+            for key in keys:
+                cached = None
+                if not bypass_cache:
+                    if key_field == "number":
+                        cached = self.cache.get(incident_number=key, fields=fields)
+                    else:
+                        cached = self.cache.get(sys_id=key, fields=fields)
+                if cached is not None:
+                    found[cached["sys_id"]] = cached
+                else:
+                    missing.append(key)
+            for i in range(0, len(missing), self.batch_chunk_size):
+                chunk = missing[i:i + self.batch_chunk_size]
+                params = {
+                    "sysparm_query": f"{key_field}IN{','.join(chunk)}",
+                    "sysparm_limit": str(len(chunk)),
+                    "sysparm_no_count": "true",
+                }
+                if fields:
+                    params["sysparm_fields"] = ",".join(fields)
+                chunks.append((LookupPlan("batch", "incident", params, None), len(chunk)))
+        return found, chunks, numbers, sys_ids
+
+    def _merge_batch_chunk(self, found: dict, response: dict, fields: tuple):
+        """Adds the records of one chunk response to `found` and the incident cache."""
+        for incident in (response or {}).get('result', []):
+            found[incident["sys_id"]] = incident
+            self.cache.put(incident, fields)
+
+    @staticmethod
+    def _batch_result(found: dict, numbers: list, sys_ids: list) -> dict:
+        """Orders the found records by request order and lists the keys that matched nothing."""
+        by_number = {incident.get("number"): incident for incident in found.values()}
+        incidents, emitted = [], set()
+        not_found = {"numbers": [], "sys_ids": []}
+        for key_field, keys, index in (("numbers", numbers, by_number), ("sys_ids", sys_ids, found)):
+            for key in keys:
+                incident = index.get(key)
+                if incident is None:
+                    not_found[key_field].append(key)
+                elif incident["sys_id"] not in emitted:
+                    emitted.add(incident["sys_id"])
+                    incidents.append(incident)
+        return {"incidents": incidents, "not_found": not_found}
+
+    def _incident_payload(self, short_description: str, caller_id: str, description: str = None, **kwargs) -> dict:
+        """Builds the request body for a new incident."""
+        incident_data = {
+            "short_description": short_description,
+            "caller_id": caller_id, # This can be a user's sys_id or their user_name
+        }
+        if description:
+            incident_data["description"] = description
+
+        # Add any other fields passed as keyword arguments
+        incident_data.update(kwargs)
+        return incident_data
+
+    def _page_params(self, encoded_query: str, fields: tuple, page_size: int, pagination: str,
+                     offset: int, last_sys_id: str) -> dict:
+        """
+        Builds the parameters for one page of an incident query.
+        "offset" pages with sysparm_offset. "keyset" orders by sys_id and continues after the
+        last sys_id seen, which stays cheap and consistent however deep the result set goes.
+        """
+        clauses = [encoded_query] if encoded_query else []
+        if pagination == "keyset":
+            if "ORDERBY" in (encoded_query or ""):
+                raise ValueError("Keyset pagination orders by sys_id; remove ORDERBY from the query.")
+            if last_sys_id:
+                clauses.append(f"sys_id>{last_sys_id}")
+            clauses.append("ORDERBYsys_id")
+        elif pagination == "offset":
+            # Offsets are only stable over a total order
+            if "ORDERBY" not in (encoded_query or ""):
+                clauses.append("ORDERBYsys_id")
+        else:
+            raise ValueError(f"Unknown pagination mode: '{pagination}'")
+
+        params = {
+            "sysparm_query": "^".join(clauses),
+            "sysparm_limit": str(page_size),
+            "sysparm_no_count": "true",
+        }
+        if pagination == "offset" and offset:
+            params["sysparm_offset"] = str(offset)
+        if fields:
+            params["sysparm_fields"] = ",".join(fields)
+        return params
+
+    def _query_page_size(self, page_size: int = None) -> int:
+        page_size = page_size or self.query_page_size
+        if not 1 <= page_size <= self.query_max_page_size:
+            raise ValueError(f"page_size must be between 1 and {self.query_max_page_size}.")
+        return page_size
+
+    def _bulk_items(self, incidents: list):
+        """
+        Validates bulk create input. Returns (pending, results): pending is a list of
+        (index, payload) to send, results holds the failures of invalid items by index.
+        """
+        pending, results = [], {}
+        for index, item in enumerate(incidents):
+            if not isinstance(item, dict) or not item.get("short_description") or not item.get("caller_id"):
+                results[index] = {
+                    "index": index, "success": False,
+                    "error": "Missing required parameters: short_description, caller_id"
+                }
+                continue
+            pending.append((index, self._incident_payload(**item)))
+        return pending, results
+
+    def _batch_api_body(self, chunk: list) -> dict:
+        """Builds a Batch API request creating one incident per (index, payload) in the chunk."""
+        headers = [{"name": name, "value": value} for name, value in self.headers.items()]
+        return {
+            "batch_request_id": str(time.time_ns()),
+            "rest_requests": [
+                {
+                    "id": str(index),
+                    "method": "POST",
+                    "url": "/api/now/table/incident",
+                    "headers": headers,
+                    "body": base64.b64encode(codec.dumps(payload)).decode("ascii"),
+                }
+                for index, payload in chunk
+            ],
+        }
+
+    def _batch_api_results(self, chunk: list, response: dict, results: dict) -> list:
+        """
+        Records the per-item outcome of a Batch API response in `results`.
+        Returns the (index, payload) items the instance did not service, to be sent individually.
+        """
+        serviced = set()
+        for item in response.get("serviced_requests", []):
+            index = int(item["id"])
+            serviced.add(index)
+            raw_body = item.get("body")
+            body = codec.loads(base64.b64decode(raw_body)) if raw_body else {}
+            if 200 <= item.get("status_code", 0) < 300:
+                created = body.get("result", {})
+                self._invalidate_record(created)
+                results[index] = {"index": index, "success": True, "result": created}
+            else:
+                message = (body.get("error") or {}).get("message") or item.get("status_text", "")
+                results[index] = {
+                    "index": index, "success": False, "status_code": item.get("status_code"),
+                    "error": f"HTTP {item.get('status_code')}: {message}"
+                }
+        return [(index, payload) for index, payload in chunk if index not in serviced]
+
+    def _bulk_failure(self, chunk: list, results: dict, error: Exception):
+        for index, _ in chunk:
+            results[index] = {"index": index, "success": False, "error": str(error)}
+
+    @staticmethod
+    def _bulk_summary(results: dict, count: int, used_batch_api: bool) -> dict:
+        ordered = [results[index] for index in range(count)]
+        created = sum(1 for result in ordered if result["success"])
+        return {"results": ordered, "created": created, "failed": count - created, "used_batch_api": used_batch_api}
+
+    def _invalidate_record(self, record: dict):
+        """Drops a record touched by a write from the incident cache."""
+        if record:
+            self.cache.invalidate(incident_number=record.get("number"), sys_id=record.get("sys_id"))
+
+    @staticmethod
+    def _first_result(response: dict) -> dict:
+        # ServiceNow Table API for GET requests returns 'result' as a list
+        if response and 'result' in response and len(response['result']) > 0:
+            return response['result'][0] # Return the first matching incident
+        return {} # No incident found
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools count every new connection they open."""
+
+    def __init__(self, counters: dict, **kwargs):
+        self._counters = counters
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        counters = self._counters
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _new_conn(self):
+                    counters["created"] += 1
+                    return super()._new_conn()
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class ServiceNowClient(_BaseServiceNowClient):
+    """Blocking client built on `requests`, for scripts and threaded callers."""
+
+    def __init__(self, pool_size: int = None, pool_max_per_host: int = None, pool_keepalive_s: float = None,
+                 state_backend: StateBackend = None):
+        super().__init__(pool_size, pool_max_per_host, pool_keepalive_s, state_backend)
+        # A long-lived Session keeps connections (and their TLS state) alive between calls.
+        # pool_block makes callers wait for a free connection instead of opening extras.
+        self._adapter = _CountingHTTPAdapter(
+            self._pool_counters,
+            pool_connections=max(1, self.pool_size // self.pool_max_per_host),
+            pool_maxsize=self.pool_max_per_host,
+            pool_block=True,
+        )
+        self._session = requests.Session()
+        self._session.auth = (self.username, self.password)
+        self._session.headers.update(self.headers)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._last_used = time.monotonic()
+        # Concurrent identical lookups share one upstream request
+        self.single_flight = SingleFlight()
+
+    def close(self):
+        """Closes the session and its pooled connections."""
+        self._session.close()
+
+    def _idle_connections(self) -> int:
+        pools = self._adapter.poolmanager.pools
+        idle = 0
+        for key in pools.keys():
+            pool = pools[key]
+            if pool.pool is not None:
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return idle
+
+    def _evict_idle_connections(self):
+        # urllib3 has no per-connection idle timeout. If the client itself has been idle for
+        # longer than the keep-alive window, every pooled connection has been too: drop them
+        # rather than risk reusing sockets the server side has already closed.
+        now = time.monotonic()
+        if now - self._last_used > self.pool_keepalive_s:
+            self._adapter.poolmanager.clear()
+        self._last_used = now
+
+    def _classify_failure(self, error: Exception):
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            return error.response.status_code, error.response.headers.get("Retry-After"), None
+        cause = error.__cause__ if isinstance(error, DeadlineExceeded) else error
+        if isinstance(cause, requests.exceptions.ConnectTimeout):
+            return None, None, CONNECT_FAILURE
+        if isinstance(cause, requests.exceptions.Timeout):
+            return None, None, TIMEOUT_FAILURE
+        if isinstance(cause, requests.exceptions.ConnectionError):
+            # requests also reports connections dropped mid-response this way
+            return None, None, TRANSPORT_FAILURE
+        return None
+
+    def _wait_for_rate_limit(self):
+        wait = self._reserve_rate_limit()
+        if wait > 0:
+            self.rate_limiter.waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                self.rate_limiter.waiting -= 1
+
+    def _make_request(self, method, endpoint, data=None, params=None, not_found_ok=False, idempotent=None):
+        """
+        Helper to make authenticated requests to ServiceNow API.
+        With not_found_ok, a 404 returns None instead of raising.
+        Failed attempts are retried as the retry policy allows; `idempotent` overrides the
+        method-based guess of whether resending is safe.
+        """
+        self.retry_policy.budget.record_request()
+        # Covers rate-limit waits, every attempt (child spans) and the backoff between them
+        with tracer.span("servicenow.request", attributes={"http.method": method, "servicenow.endpoint": endpoint}) as span:
+            attempt = 0
+            while True:
+                self._wait_for_rate_limit()
+                # Fails fast with UpstreamUnavailable while the breaker is open (never retried)
+                self.circuit_breaker.acquire()
+                started = time.perf_counter()
+                try:
+                    response = self._send_once(method, endpoint, data, params, not_found_ok)
+                except BaseException as e:
+                    self._record_breaker_outcome(e, started)
+                    if not isinstance(e, Exception):
+                        raise
+                    delay = self._retry_delay(method, attempt, e, idempotent)
+                    if delay is None:
+                        span.set_attribute("attempts", attempt + 1)
+                        raise
+                else:
+                    self.circuit_breaker.record_success(time.perf_counter() - started)
+                    span.set_attribute("attempts", attempt + 1)
+                    return response
+                logger.warning("Retrying %s %s in %.2fs (attempt %d).", method, endpoint, delay, attempt + 2)
+                time.sleep(delay)
+                attempt += 1
+
+    def _send_once(self, method, endpoint, data=None, params=None, not_found_ok=False):
+        """Sends a single attempt of a request to ServiceNow."""
+        url = self._url(endpoint)
+        timeout = self._timeouts()
+        self._evict_idle_connections()
+        self._pool_counters["requests"] += 1
+        self._pool_counters["in_use"] += 1
+        started = time.perf_counter()
+        status = "error"
+        span, trace_headers = self._start_attempt_span()
         try:
-            response = requests.request(
+            response = self._session.request(
                 method,
                 url,
-                auth=(self.username, self.password),
-                headers=self.headers,
-                json=data,
-                params=params
+                data=codec.dumps(data) if data is not None else None,
+                params=params,
+                headers=trace_headers,
+                timeout=timeout
             )
+            status = response.status_code
+            UPSTREAM_BYTES_IN.inc(amount=len(response.content))
+            if not_found_ok and response.status_code == 404:
+                return None
             response.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
-            return response.json()
+            return codec.loads(response.content)  # Decode the raw body once
         except requests.exceptions.HTTPError as e:
-            print(f"HTTP Error: {e.response.status_code} - {e.response.text}")
-            raise
-        except requests.exceptions.ConnectionError as e:
-            print(f"Connection Error: {e}")
+            logger.error("HTTP Error: %s %s -> %d", method, endpoint, e.response.status_code,
+                         extra={"category": "upstream", "payload": e.response.text})
             raise
         except requests.exceptions.Timeout as e:
-            print(f"Timeout Error: {e}")
+            # Checked before ConnectionError, which ConnectTimeout also derives from
+            status = "timeout"
+            logger.error("Timeout Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
+            raise DeadlineExceeded(f"ServiceNow did not respond in time: {e}") from e
+        except requests.exceptions.ConnectionError as e:
+            logger.error("Connection Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
             raise
         except requests.exceptions.RequestException as e:
-            print(f"Request Error: {e}")
+            logger.error("Request Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
             raise
+        finally:
+            self._pool_counters["in_use"] -= 1
+            self._record_upstream(method, status, started, span)
 
-    def get_incident(self, incident_number: str = None, sys_id: str = None) -> dict:
+    def get_incident(self, incident_number: str = None, sys_id: str = None, bypass_cache: bool = False,
+                     fields: list = None, field_profile: str = None) -> dict:
         """
         Retrieves incident details by number or sys_id.
         Requires 'number' or 'sys_id' as a parameter.
+        `fields` (or a named `field_profile`) limits the returned fields via sysparm_fields.
+        Served from the incident cache unless bypass_cache is set.
         """
-        if not incident_number and not sys_id:
-            raise ValueError("Either incident_number or sys_id must be provided to get an incident.")
+        fields = self._resolve_fields(fields, field_profile)
+        plan = self._plan_incident_lookup(incident_number, sys_id, fields)
+        if not bypass_cache:
+            cached = self.cache.get(incident_number, sys_id, fields)
+            if cached is not None:
+                return cached
 
-        params = {}
-        if incident_number:
-            params['number'] = incident_number
-        if sys_id:
-            params['sys_id'] = sys_id
+        key = ("incident", incident_number, sys_id, fields)
+        try:
+            return self.single_flight.do(key, lambda: self._fetch_incident(plan, fields))
+        except UpstreamUnavailable as e:
+            return self._serve_stale(e, incident_number, sys_id, fields)
 
-        response = self._make_request("GET", "incident", params=params)
-        
-        # ServiceNow Table API for GET requests returns 'result' as a list
-        if response and 'result' in response and len(response['result']) > 0:
-            return response['result'][0] # Return the first matching incident
-        return {} # No incident found
+    def _fetch_incident(self, plan: LookupPlan, fields: tuple = None) -> dict:
+        started = time.perf_counter()
+        try:
+            response = self._make_request("GET", plan.endpoint, params=plan.params, not_found_ok=True)
+        except Exception:
+            self._record_lookup(plan.path, started, found=False, failed=True)
+            raise
+        incident = self._plan_result(plan, response)
+        self._record_lookup(plan.path, started, found=bool(incident))
+        self.cache.put(incident, fields)
+        return incident
+
+    def get_incidents(self, numbers: list = None, sys_ids: list = None, bypass_cache: bool = False,
+                      fields: list = None, field_profile: str = None) -> dict:
+        """
+        Retrieves many incidents by number and/or sys_id with chunked IN queries.
+        Cached records are served without an upstream call.
+        Returns {"incidents": [...], "not_found": {"numbers": [...], "sys_ids": [...]}}.
+        """
+        fields = self._resolve_fields(fields, field_profile)
+        found, chunks, numbers, sys_ids = self._plan_batch_lookup(numbers, sys_ids, fields, bypass_cache)
+        for plan, key_count in chunks:
+            self._merge_batch_chunk(found, self._fetch_batch_chunk(plan, key_count), fields)
+        return self._batch_result(found, numbers, sys_ids)
+
+    def _fetch_batch_chunk(self, plan: LookupPlan, key_count: int) -> dict:
+        started = time.perf_counter()
+        try:
+            response = self._make_request("GET", plan.endpoint, params=plan.params)
+        except Exception:
+            self._record_lookup(plan.path, started, found=False, failed=True)
+            raise
+        self._record_lookup(plan.path, started, found=len(response.get('result', [])) == key_count)
+        return response
+
+    def iter_incident_pages(self, encoded_query: str = "", fields: list = None, page_size: int = None,
+                            pagination: str = "offset", max_records: int = None, field_profile: str = None):
+        """
+        Yields the incidents matching an encoded query one page (list of records) at a time,
+        fetching each page only when the previous one has been consumed.
+        """
+        fields = self._resolve_fields(fields, field_profile)
+        page_size = self._query_page_size(page_size)
+        offset, last_sys_id, returned = 0, None, 0
+        while max_records is None or returned < max_records:
+            limit = page_size if max_records is None else min(page_size, max_records - returned)
+            params = self._page_params(encoded_query, fields, limit, pagination, offset, last_sys_id)
+            page = self._make_request("GET", "incident", params=params).get('result', [])
+            if page:
+                yield page
+                returned += len(page)
+                offset += len(page)
+                last_sys_id = page[-1].get("sys_id")
+            if len(page) < limit:
+                return
+
+    def iter_incidents(self, encoded_query: str = "", fields: list = None, page_size: int = None,
+                       pagination: str = "offset", max_records: int = None, field_profile: str = None):
+        """Yields the incidents matching an encoded query one record at a time, paging upstream."""
+        for page in self.iter_incident_pages(encoded_query, fields, page_size, pagination, max_records, field_profile):
+            yield from page
 
     def create_incident(self, short_description: str, caller_id: str, description: str = None, **kwargs) -> dict:
         """
@@ -71,18 +742,406 @@ class ServiceNowClient:
         Requires 'short_description' and 'caller_id' (sys_id or user_name).
         Additional fields can be passed via kwargs.
         """
-        incident_data = {
-            "short_description": short_description,
-            "caller_id": caller_id, # This can be a user's sys_id or their user_name
-        }
-        if description:
-            incident_data["description"] = description
-        
-        # Add any other fields passed as keyword arguments
-        incident_data.update(kwargs)
-
+        incident_data = self._incident_payload(short_description, caller_id, description, **kwargs)
         response = self._make_request("POST", "incident", data=incident_data)
-        return response.get('result', {}) # ServiceNow returns the created record in 'result'
+        created = response.get('result', {}) # ServiceNow returns the created record in 'result'
+        self._invalidate_record(created)
+        return created
+
+    def create_incidents(self, incidents: list, batch_size: int = None) -> dict:
+        """
+        Creates many incidents, packing up to batch_size creates into each Batch API request.
+        Falls back to individual POSTs (bounded concurrency) if the Batch API is unavailable.
+        Returns per-item results in input order plus created/failed counts.
+        """
+        batch_size = batch_size or self.bulk_batch_size
+        pending, results = self._bulk_items(incidents)
+        individual, used_batch_api = [], False
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            if not self._batch_api_available:
+                individual.extend(chunk)
+                continue
+            try:
+                response = self._make_request("POST", BATCH_API_PATH, data=self._batch_api_body(chunk))
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code not in BATCH_API_UNAVAILABLE_STATUSES:
+                    # The instance may have created some of these already; do not resend them
+                    self._bulk_failure(chunk, results, e)
+                    continue
+                logger.warning("Batch API unavailable (HTTP %d); falling back to individual creates.", e.response.status_code)
+                self._batch_api_available = False
+                individual.extend(chunk)
+                continue
+            except Exception as e:
+                # Connection errors, an expired deadline or an open breaker fail this chunk only, so
+                # the outcome of chunks already created is still reported (and not retried as a whole)
+                logger.warning("Batch API request for %d incident(s) failed: %s", len(chunk), e)
+                self._bulk_failure(chunk, results, e)
+                continue
+            used_batch_api = True
+            individual.extend(self._batch_api_results(chunk, response, results))
+
+        def create_one(item):
+            index, payload = item
+            try:
+                results[index] = {"index": index, "success": True, "result": self.create_incident(**payload)}
+            except Exception as e:
+                results[index] = {"index": index, "success": False, "error": str(e)}
+
+        if individual:
+            with ThreadPoolExecutor(max_workers=self.bulk_fallback_concurrency) as executor:
+                # Run each create in a copy of the caller's context so its deadline still applies
+                futures = [executor.submit(contextvars.copy_context().run, create_one, item) for item in individual]
+                for future in futures:
+                    future.result()
+        return self._bulk_summary(results, len(incidents), used_batch_api)
+
+
+class AsyncServiceNowClient(_BaseServiceNowClient):
+    """
+    Non-blocking client built on `httpx.AsyncClient`, for use inside the event loop.
+    Exposes the same methods as ServiceNowClient as coroutines.
+    """
+
+    def __init__(self, pool_size: int = None, pool_max_per_host: int = None, pool_keepalive_s: float = None,
+                 state_backend: StateBackend = None):
+        super().__init__(pool_size, pool_max_per_host, pool_keepalive_s, state_backend)
+        # httpx only has a global connection cap. Every request goes to the single instance
+        # host, so the per-host cap is the one that actually applies.
+        max_connections = min(self.pool_size, self.pool_max_per_host)
+        self._client = httpx.AsyncClient(
+            auth=(self.username, self.password),
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=self.pool_keepalive_s,
+            ),
+        )
+        self._request_extensions = {"trace": self._trace}
+        # Concurrent identical lookups share one upstream request
+        self.single_flight = AsyncSingleFlight()
+        # Shared (SQLite) cache and rate-limit calls take the database write lock, which another
+        # worker may hold for up to the busy timeout, so they run on threads of their own
+        self._state_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SERVICENOW_STATE_THREADS", "4")), thread_name_prefix="sn-state"
+        ) if self.shared_state else None
+
+    async def aclose(self):
+        """Closes the underlying HTTP client and its connections."""
+        await self._client.aclose()
+        if self._state_executor is not None:
+            self._state_executor.shutdown(wait=False)
+
+    def _submit_state_call(self, fn, *args):
+        """Starts `fn(*args)` on the state threads, in the current context; returns its future."""
+        return self._state_executor.submit(contextvars.copy_context().run, fn, *args)
+
+    async def _state_call(self, fn, *args):
+        """Calls a cache or rate-limiter method without blocking the event loop on a shared backend."""
+        if self._state_executor is None:
+            return fn(*args)
+        return await asyncio.wrap_future(self._submit_state_call(fn, *args))
+
+    async def drop_session(self, session_id: str):
+        """Releases the rate-limit bucket of a session that has ended."""
+        await self._state_call(self.rate_limiter.drop_session, session_id)
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore emits this once per newly opened connection; reused ones skip it.
+        if event_name == "connection.connect_tcp.complete":
+            self._pool_counters["created"] += 1
+
+    def _idle_connections(self) -> int:
+        # httpx does not expose its pool publicly; read it from the default transport.
+        pool = getattr(self._client._transport, "_pool", None)
+        if pool is None:
+            return 0
+        return sum(1 for conn in pool.connections if conn.is_idle())
+
+    def _classify_failure(self, error: Exception):
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code, error.response.headers.get("Retry-After"), None
+        cause = error.__cause__ if isinstance(error, DeadlineExceeded) else error
+        if isinstance(cause, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return None, None, CONNECT_FAILURE
+        if isinstance(cause, httpx.TimeoutException):
+            return None, None, TIMEOUT_FAILURE
+        if isinstance(cause, httpx.TransportError):
+            return None, None, TRANSPORT_FAILURE
+        return None
+
+    async def _wait_for_rate_limit(self):
+        session_id = current_session_id.get()
+        if self._state_executor is None:
+            wait = self._reserve_rate_limit()
+        else:
+            reservation = self._submit_state_call(self._reserve_rate_limit)
+            try:
+                wait = await asyncio.wrap_future(reservation)
+            except asyncio.CancelledError:
+                if not reservation.cancelled():
+                    # Already running in its thread, so it still takes a token
+                    await self._refund_rate_limit(session_id, after=reservation)
+                raise
+        if wait > 0:
+            self.rate_limiter.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # The reserved request will never be sent
+                await self._refund_rate_limit(session_id)
+                raise
+            finally:
+                self.rate_limiter.waiting -= 1
+
+    async def _refund_rate_limit(self, session_id: str, after=None):
+        """
+        Gives back the token of a request that will never be sent (once the `after` reservation
+        has finished, if given). Called while being cancelled, so the refund is shielded: it must
+        land before the session's bucket is dropped.
+        """
+        if self._state_executor is None:
+            self.rate_limiter.refund(session_id)
+            return
+
+        async def refund():
+            if after is not None:
+                try:
+                    await asyncio.wrap_future(after)
+                except Exception:
+                    return  # Nothing was reserved (e.g. the wait would have been too long)
+            await self._state_call(self.rate_limiter.refund, session_id)
+        await asyncio.shield(refund())
+
+    async def _make_request(self, method, endpoint, data=None, params=None, not_found_ok=False, idempotent=None):
+        """
+        Helper to make authenticated requests to ServiceNow API.
+        With not_found_ok, a 404 returns None instead of raising.
+        Failed attempts are retried as the retry policy allows; `idempotent` overrides the
+        method-based guess of whether resending is safe.
+        """
+        self.retry_policy.budget.record_request()
+        # Covers rate-limit waits, every attempt (child spans) and the backoff between them
+        with tracer.span("servicenow.request", attributes={"http.method": method, "servicenow.endpoint": endpoint}) as span:
+            attempt = 0
+            while True:
+                await self._wait_for_rate_limit()
+                # Fails fast with UpstreamUnavailable while the breaker is open (never retried)
+                self.circuit_breaker.acquire()
+                started = time.perf_counter()
+                try:
+                    response = await self._send_once(method, endpoint, data, params, not_found_ok)
+                except BaseException as e:
+                    self._record_breaker_outcome(e, started)
+                    if not isinstance(e, Exception):
+                        raise
+                    delay = self._retry_delay(method, attempt, e, idempotent)
+                    if delay is None:
+                        span.set_attribute("attempts", attempt + 1)
+                        raise
+                else:
+                    self.circuit_breaker.record_success(time.perf_counter() - started)
+                    span.set_attribute("attempts", attempt + 1)
+                    return response
+                logger.warning("Retrying %s %s in %.2fs (attempt %d).", method, endpoint, delay, attempt + 2)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _send_once(self, method, endpoint, data=None, params=None, not_found_ok=False):
+        """Sends a single attempt of a request to ServiceNow."""
+        url = self._url(endpoint)
+        connect_timeout, read_timeout = self._timeouts()
+        self._pool_counters["requests"] += 1
+        self._pool_counters["in_use"] += 1
+        started = time.perf_counter()
+        status = "error"
+        span, trace_headers = self._start_attempt_span()
+        try:
+            response = await self._client.request(
+                method,
+                url,
+                content=codec.dumps(data) if data is not None else None,
+                params=params,
+                headers=trace_headers,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout),
+                extensions=self._request_extensions
+            )
+            status = response.status_code
+            UPSTREAM_BYTES_IN.inc(amount=len(response.content))
+            if not_found_ok and response.status_code == 404:
+                return None
+            response.raise_for_status()  # Raises HTTPStatusError for bad responses (4xx or 5xx)
+            return codec.loads(response.content)  # Decode the raw body once
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP Error: %s %s -> %d", method, endpoint, e.response.status_code,
+                         extra={"category": "upstream", "payload": e.response.text})
+            raise
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            logger.error("Timeout Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
+            raise DeadlineExceeded(f"ServiceNow did not respond in time: {e}") from e
+        except httpx.TransportError as e:
+            logger.error("Connection Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
+            raise
+        except httpx.HTTPError as e:
+            logger.error("Request Error: %s %s: %s", method, endpoint, e, extra={"category": "upstream"})
+            raise
+        finally:
+            self._pool_counters["in_use"] -= 1
+            self._record_upstream(method, status, started, span)
+
+    async def get_incident(self, incident_number: str = None, sys_id: str = None, bypass_cache: bool = False,
+                           fields: list = None, field_profile: str = None) -> dict:
+        """
+        Retrieves incident details by number or sys_id.
+        Requires 'number' or 'sys_id' as a parameter.
+        `fields` (or a named `field_profile`) limits the returned fields via sysparm_fields.
+        Served from the incident cache unless bypass_cache is set.
+        """
+        fields = self._resolve_fields(fields, field_profile)
+        plan = self._plan_incident_lookup(incident_number, sys_id, fields)
+        if not bypass_cache:
+            cached = await self._state_call(self.cache.get, incident_number, sys_id, fields)
+            if cached is not None:
+                return cached
+
+        key = ("incident", incident_number, sys_id, fields)
+        try:
+            return await self.single_flight.do(key, lambda: self._fetch_shared_incident(plan, fields))
+        except UpstreamUnavailable as e:
+            return await self._state_call(self._serve_stale, e, incident_number, sys_id, fields)
+
+    async def _fetch_shared_incident(self, plan: LookupPlan, fields: tuple = None) -> dict:
+        # Runs in its own task on behalf of every coalesced caller. Each caller enforces its own
+        # deadline while waiting, so no single caller's deadline may cut the shared request short.
+        current_deadline.set(None)
+        return await self._fetch_incident(plan, fields)
+
+    async def _fetch_incident(self, plan: LookupPlan, fields: tuple = None) -> dict:
+        started = time.perf_counter()
+        try:
+            response = await self._make_request("GET", plan.endpoint, params=plan.params, not_found_ok=True)
+        except Exception:
+            self._record_lookup(plan.path, started, found=False, failed=True)
+            raise
+        incident = self._plan_result(plan, response)
+        self._record_lookup(plan.path, started, found=bool(incident))
+        await self._state_call(self.cache.put, incident, fields)
+        return incident
+
+    async def get_incidents(self, numbers: list = None, sys_ids: list = None, bypass_cache: bool = False,
+                            fields: list = None, field_profile: str = None) -> dict:
+        """
+        Retrieves many incidents by number and/or sys_id with chunked IN queries.
+        Cached records are served without an upstream call; chunks are fetched concurrently.
+        Returns {"incidents": [...], "not_found": {"numbers": [...], "sys_ids": [...]}}.
+        """
+        fields = self._resolve_fields(fields, field_profile)
+        found, chunks, numbers, sys_ids = await self._state_call(
+            self._plan_batch_lookup, numbers, sys_ids, fields, bypass_cache)
+        responses = await asyncio.gather(*(self._fetch_batch_chunk(plan, key_count) for plan, key_count in chunks))
+        for response in responses:
+            await self._state_call(self._merge_batch_chunk, found, response, fields)
+        return self._batch_result(found, numbers, sys_ids)
+
+    async def _fetch_batch_chunk(self, plan: LookupPlan, key_count: int) -> dict:
+        started = time.perf_counter()
+        try:
+            response = await self._make_request("GET", plan.endpoint, params=plan.params)
+        except Exception:
+            self._record_lookup(plan.path, started, found=False, failed=True)
+            raise
+        self._record_lookup(plan.path, started, found=len(response.get('result', [])) == key_count)
+        return response
+
+    async def iter_incident_pages(self, encoded_query: str = "", fields: list = None, page_size: int = None,
+                                  pagination: str = "offset", max_records: int = None, field_profile: str = None):
+        """
+        Yields the incidents matching an encoded query one page (list of records) at a time,
+        fetching each page only when the previous one has been consumed.
+        """
+        fields = self._resolve_fields(fields, field_profile)
+        page_size = self._query_page_size(page_size)
+        offset, last_sys_id, returned = 0, None, 0
+        while max_records is None or returned < max_records:
+            limit = page_size if max_records is None else min(page_size, max_records - returned)
+            params = self._page_params(encoded_query, fields, limit, pagination, offset, last_sys_id)
+            page = (await self._make_request("GET", "incident", params=params)).get('result', [])
+            if page:
+                yield page
+                returned += len(page)
+                offset += len(page)
+                last_sys_id = page[-1].get("sys_id")
+            if len(page) < limit:
+                return
+
+    async def iter_incidents(self, encoded_query: str = "", fields: list = None, page_size: int = None,
+                             pagination: str = "offset", max_records: int = None, field_profile: str = None):
+        """Yields the incidents matching an encoded query one record at a time, paging upstream."""
+        async for page in self.iter_incident_pages(encoded_query, fields, page_size, pagination, max_records, field_profile):
+            for incident in page:
+                yield incident
+
+    async def create_incident(self, short_description: str, caller_id: str, description: str = None, **kwargs) -> dict:
+        """
+        Creates a new incident.
+        Requires 'short_description' and 'caller_id' (sys_id or user_name).
+        Additional fields can be passed via kwargs.
+        """
+        incident_data = self._incident_payload(short_description, caller_id, description, **kwargs)
+        response = await self._make_request("POST", "incident", data=incident_data)
+        created = response.get('result', {}) # ServiceNow returns the created record in 'result'
+        await self._state_call(self._invalidate_record, created)
+        return created
+
+    async def create_incidents(self, incidents: list, batch_size: int = None) -> dict:
+        """
+        Creates many incidents, packing up to batch_size creates into each Batch API request.
+        Falls back to individual POSTs (bounded concurrency) if the Batch API is unavailable.
+        Returns per-item results in input order plus created/failed counts.
+        """
+        batch_size = batch_size or self.bulk_batch_size
+        pending, results = self._bulk_items(incidents)
+        individual, used_batch_api = [], False
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            if not self._batch_api_available:
+                individual.extend(chunk)
+                continue
+            try:
+                response = await self._make_request("POST", BATCH_API_PATH, data=self._batch_api_body(chunk))
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in BATCH_API_UNAVAILABLE_STATUSES:
+                    # The instance may have created some of these already; do not resend them
+                    self._bulk_failure(chunk, results, e)
+                    continue
+                logger.warning("Batch API unavailable (HTTP %d); falling back to individual creates.", e.response.status_code)
+                self._batch_api_available = False
+                individual.extend(chunk)
+                continue
+            except Exception as e:
+                # Connection errors, an expired deadline or an open breaker fail this chunk only, so
+                # the outcome of chunks already created is still reported (and not retried as a whole)
+                logger.warning("Batch API request for %d incident(s) failed: %s", len(chunk), e)
+                self._bulk_failure(chunk, results, e)
+                continue
+            used_batch_api = True
+            # Invalidates the cache entry of every created record: one hop to the state threads per chunk
+            individual.extend(await self._state_call(self._batch_api_results, chunk, response, results))
+
+        semaphore = asyncio.Semaphore(self.bulk_fallback_concurrency)
+
+        async def create_one(index, payload):
+            async with semaphore:
+                try:
+                    results[index] = {"index": index, "success": True, "result": await self.create_incident(**payload)}
+                except Exception as e:
+                    results[index] = {"index": index, "success": False, "error": str(e)}
+
+        await asyncio.gather(*(create_one(index, payload) for index, payload in individual))
+        return self._bulk_summary(results, len(incidents), used_batch_api)
 
 # Example Usage (for testing the client)
 if __name__ == "__main__":
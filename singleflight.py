@@ -0,0 +1,114 @@
+# singleflight.py
+import asyncio
+import threading
+
+
+class _FlightStats:
+    """Counters shared by the sync and async single-flight groups."""
+
+    def __init__(self):
+        self.calls = 0       # Every call to do()
+        self.executions = 0  # Calls that actually ran the function
+        self.coalesced = 0   # Calls that joined an execution already in flight
+        self._calls = {}
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight(_FlightStats):
+    """
+    Collapses concurrent calls with the same key into one execution.
+    The first caller starts the work; callers arriving while it is in flight await the
+    same task and receive the same result (or exception). If every waiter is cancelled
+    (e.g. they all hit their deadlines), the shared work is cancelled too.
+    """
+
+    async def do(self, key, fn):
+        """Runs the coroutine function `fn` once per key at a time and returns its result."""
+        self.calls += 1
+        flight = self._calls.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = self._calls[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda t: self._finish(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # Shield so one caller being cancelled does not cancel the shared work for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                # The task only finishes (and unregisters) on a later loop pass: callers
+                # arriving before then must start fresh work, not join the cancelled one
+                if self._calls.get(key) is flight:
+                    del self._calls[key]
+
+    def _finish(self, key, flight):
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # Mark retrieved even if every waiter went away
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_FlightStats):
+    """Thread-based counterpart of AsyncSingleFlight for the blocking client."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Runs `fn` once per key at a time and returns its result to every waiting thread."""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                self.executions += 1
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
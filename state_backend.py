@@ -0,0 +1,347 @@
+# state_backend.py
+# Where the incident cache, rate-limit buckets and session registry keep their state.
+# "memory" (default) keeps it in the process. "sqlite" keeps it in a SQLite database on
+# tmpfs (/dev/shm) shared by every worker process on the host, so `uvicorn --workers N`
+# gets one warm cache and one upstream quota instead of N.
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from codec import codec
+from incident_cache import IncidentCache, _Entry
+from rate_limiter import RateLimiter, TokenBucket
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    sys_id TEXT PRIMARY KEY,
+    number TEXT,
+    fields TEXT,
+    record BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS incidents_number ON incidents (number);
+CREATE INDEX IF NOT EXISTS incidents_expires_at ON incidents (expires_at);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    connected_at REAL NOT NULL
+);
+"""
+
+
+def default_state_path() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "servicenow-mcp-state.db")
+
+
+class SqliteState:
+    """
+    A SQLite database shared between processes. Each thread gets its own connection.
+    WAL mode lets readers run alongside a writer; durability is not needed for this state.
+    """
+
+    def __init__(self, path: str, busy_timeout_s: float = 5.0):
+        self.path = path
+        self.busy_timeout_s = busy_timeout_s
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transaction() opens write transactions explicitly
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction that takes the database write lock up front."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class SharedIncidentCache(IncidentCache):
+    """
+    IncidentCache whose entries live in a SqliteState, visible to every worker.
+    Expiry uses wall-clock time so it compares across processes. When over its limits it
+    evicts the entries closest to expiry rather than the least recently used, so a hit
+    does not need a write. Hit/miss counters are per process.
+    """
+
+    def __init__(self, state: SqliteState, **kwargs):
+        super().__init__(**kwargs)
+        self.state = state
+
+    def _load(self, incident_number: str, sys_id: str, fields):
+        """Returns the matching _Entry, or None. Drops rows that are past the stale window."""
+        conn = self.state.connection()
+        if sys_id:
+            row = conn.execute("SELECT sys_id, number, fields, record, size, expires_at FROM incidents WHERE sys_id = ?",
+                               (sys_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT sys_id, number, fields, record, size, expires_at FROM incidents WHERE number = ?",
+                               (incident_number,)).fetchone()
+        if row is None:
+            return None
+        key, number, stored_fields, record, size, expires_at = row
+        if expires_at + self.stale_ttl_s <= time.time():
+            conn.execute("DELETE FROM incidents WHERE sys_id = ?", (key,))
+            return None
+        entry = _Entry(None, number, frozenset(codec.loads(stored_fields)) if stored_fields else None, size, expires_at)
+        if (incident_number and number != incident_number) or not entry.covers(fields):
+            return None
+        entry.record = codec.loads(record)
+        return entry
+
+    def get(self, incident_number: str = None, sys_id: str = None, fields=None):
+        if not self.enabled:
+            return None
+        entry = self._load(incident_number, sys_id, fields)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._copy(entry, fields)
+
+    def get_stale(self, incident_number: str = None, sys_id: str = None, fields=None):
+        if not self.enabled:
+            return None
+        entry = self._load(incident_number, sys_id, fields)
+        if entry is None:
+            return None
+        with self._lock:
+            self.stale_hits += 1
+        return self._copy(entry, fields)
+
+    def put(self, record: dict, fields=None):
+        sys_id = record.get("sys_id") if record else None
+        if not self.enabled or not sys_id or not isinstance(sys_id, str):
+            return
+        number = record.get("number") if isinstance(record.get("number"), str) else None
+        blob = codec.dumps(record)
+        size = len(blob)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        stored_fields = codec.dumps_text(sorted(fields)) if fields is not None else None
+        evicted = 0
+        with self.state.transaction() as conn:
+            conn.execute("DELETE FROM incidents WHERE sys_id = ? OR number = ?", (sys_id, number))
+            conn.execute("DELETE FROM incidents WHERE expires_at + ? <= ?", (self.stale_ttl_s, now))
+            conn.execute(
+                "INSERT INTO incidents (sys_id, number, fields, record, size, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (sys_id, number, stored_fields, blob, size, now + self.ttl_s)
+            )
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM incidents").fetchone()
+            while count > self.max_entries or total > self.max_bytes:
+                oldest, oldest_size = conn.execute(
+                    "SELECT sys_id, size FROM incidents ORDER BY expires_at LIMIT 1").fetchone()
+                conn.execute("DELETE FROM incidents WHERE sys_id = ?", (oldest,))
+                count -= 1
+                total -= oldest_size
+                evicted += 1
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def invalidate(self, incident_number: str = None, sys_id: str = None):
+        with self.state.transaction() as conn:
+            removed = conn.execute("DELETE FROM incidents WHERE sys_id = ? OR number = ?", (sys_id, incident_number)).rowcount
+        if removed:
+            with self._lock:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.state.transaction() as conn:
+            conn.execute("DELETE FROM incidents")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        count, total = self.state.connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM incidents").fetchone()
+        stats.update({"entries": count, "bytes": total})
+        return stats
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose buckets live in a SqliteState, so the global limit holds for all
+    workers together. Each reservation is one write transaction. Wait statistics are per process.
+    """
+
+    GLOBAL_KEY = "global"
+
+    def __init__(self, state: SqliteState, **kwargs):
+        super().__init__(**kwargs)
+        self.state = state
+
+    def _bucket_specs(self, session_id: str) -> list:
+        specs = [(self.GLOBAL_KEY, self.rate, self.burst)] if self.rate > 0 else []
+        if session_id and self.session_rate > 0:
+            specs.append((f"session:{session_id}", self.session_rate, self.session_burst))
+        return specs
+
+    @staticmethod
+    def _load(conn, key: str, rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = TokenBucket(rate, burst)
+        row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+        bucket.tokens, bucket.updated = row if row else (burst, now)
+        return bucket
+
+    @staticmethod
+    def _store(conn, key: str, bucket: TokenBucket):
+        conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                     (key, bucket.tokens, bucket.updated))
+
+    def reserve(self, session_id: str = None, max_wait_s: float = None) -> float:
+        specs = self._bucket_specs(session_id)
+        if not specs:
+            return 0.0
+        with self._lock, self.state.transaction() as conn:
+            now = time.time()
+            buckets = [(key, self._load(conn, key, rate, burst, now)) for key, rate, burst in specs]
+            wait = max(bucket.wait_time(now) for _, bucket in buckets)
+            self._check_wait(wait, max_wait_s)
+            for key, bucket in buckets:
+                bucket.take()
+                self._store(conn, key, bucket)
+            self._record_wait(wait)
+            return wait
+
+    def refund(self, session_id: str = None):
+        specs = self._bucket_specs(session_id)
+        if not specs:
+            return
+        with self._lock, self.state.transaction() as conn:
+            now = time.time()
+            for key, rate, burst in specs:
+                bucket = self._load(conn, key, rate, burst, now)
+                bucket.refund()
+                self._store(conn, key, bucket)
+
+    def drop_session(self, session_id: str):
+        with self.state.transaction() as conn:
+            conn.execute("DELETE FROM rate_buckets WHERE key = ?", (f"session:{session_id}",))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["sessions"] = self.state.connection().execute(
+            "SELECT COUNT(*) FROM rate_buckets WHERE key LIKE 'session:%'").fetchone()[0]
+        return stats
+
+
+class SessionRegistry:
+    """Sessions connected to this process."""
+
+    shared = False  # Whether updates write to a shared store (and may block)
+
+    def __init__(self):
+        # Key: session_id, Value: connection time
+        self._sessions = {}
+
+    def register(self, session_id: str):
+        self._sessions[session_id] = time.time()
+
+    def unregister(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def count(self) -> int:
+        """Sessions connected to every worker sharing this registry."""
+        return len(self._sessions)
+
+    def per_worker(self) -> dict:
+        return {os.getpid(): len(self._sessions)}
+
+
+class SharedSessionRegistry(SessionRegistry):
+    """
+    Session registry kept in a SqliteState, so any worker can report every worker's sessions.
+    Rows left behind by workers that died are purged when a worker starts.
+    """
+
+    shared = True
+
+    def __init__(self, state: SqliteState):
+        super().__init__()
+        self.state = state
+        self._purge_dead_workers()
+
+    def _purge_dead_workers(self):
+        conn = self.state.connection()
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM sessions").fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute("DELETE FROM sessions WHERE pid = ?", (pid,))
+            except PermissionError:
+                pass  # Alive, owned by another user
+
+    def register(self, session_id: str):
+        self.state.connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, pid, connected_at) VALUES (?, ?, ?)",
+            (session_id, os.getpid(), time.time())
+        )
+
+    def unregister(self, session_id: str):
+        self.state.connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def count(self) -> int:
+        return self.state.connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def per_worker(self) -> dict:
+        return dict(self.state.connection().execute("SELECT pid, COUNT(*) FROM sessions GROUP BY pid").fetchall())
+
+
+class StateBackend:
+    """Builds the stateful components for the backend named by MCP_STATE_BACKEND."""
+
+    def __init__(self, kind: str = None, path: str = None):
+        self.kind = kind or os.getenv("MCP_STATE_BACKEND", "memory")
+        if self.kind == "memory":
+            self.state = None
+        elif self.kind == "sqlite":
+            self.state = SqliteState(path or os.getenv("MCP_STATE_PATH") or default_state_path())
+        else:
+            raise ValueError(f"Unknown state backend: '{self.kind}'")
+
+    def incident_cache(self) -> IncidentCache:
+        return SharedIncidentCache(self.state) if self.state else IncidentCache()
+
+    def rate_limiter(self) -> RateLimiter:
+        return SharedRateLimiter(self.state) if self.state else RateLimiter()
+
+    def session_registry(self) -> SessionRegistry:
+        return SharedSessionRegistry(self.state) if self.state else SessionRegistry()
+
+
+_default_backend = None
+
+
+def get_state_backend() -> StateBackend:
+    """The process-wide backend, created from the environment on first use."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = StateBackend()
+    return _default_backend
@@ -0,0 +1,177 @@
+# structured_logging.py
+# Logging pipeline that keeps I/O off the event loop: records are put on a queue by the
+# calling thread and formatted/written by a QueueListener on a background thread.
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from codec import codec
+from call_context import current_message_id, current_session_id
+
+# Record attributes (passed via `extra=`) copied into the JSON line when present
+STRUCTURED_FIELDS = ("session_id", "message_id", "tool_name", "category", "payload")
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """Parses "frame=0.01,heartbeat=0" into {"frame": 0.01, "heartbeat": 0.0}."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            category, rate = item.split("=", 1)
+            rates[category.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def truncate(value, max_chars: int) -> str:
+    """Renders `value` as compact JSON (or str) and cuts it to `max_chars` characters."""
+    if not isinstance(value, str):
+        try:
+            value = codec.dumps_text(value)
+        except TypeError:
+            value = str(value)
+    if len(value) > max_chars:
+        return f"{value[:max_chars]}...[{len(value) - max_chars} more chars]"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def __init__(self, payload_max_chars: int = 512):
+        super().__init__()
+        self.payload_max_chars = payload_max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = truncate(value, self.payload_max_chars) if field == "payload" else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return codec.dumps_text(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development; appends the truncated payload, if any."""
+
+    def __init__(self, payload_max_chars: int = 512):
+        super().__init__(TEXT_FORMAT)
+        self.payload_max_chars = payload_max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            line = f"{line} | {truncate(payload, self.payload_max_chars)}"
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random fraction of the records of each category (the `category` extra).
+    Records at WARNING and above, and records without a category, are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "category", None), 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them, so the message and payload are only rendered
+    on the listener thread. Drops records instead of blocking when the queue is full.
+    Arguments passed to a log call must therefore not be mutated after the call.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Context variables are not visible from the listener thread; capture them here
+        if getattr(record, "session_id", None) is None:
+            record.session_id = current_session_id.get()
+        if getattr(record, "message_id", None) is None:
+            record.message_id = current_message_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """The queue handler installed on the root logger and the listener draining it."""
+
+    def __init__(self, handler: NonBlockingQueueHandler, listener: logging.handlers.QueueListener, sampler: SamplingFilter):
+        self.handler = handler
+        self.listener = listener
+        self.sampler = sampler
+
+    def stop(self):
+        """Flushes the queue and stops the listener thread."""
+        self.listener.stop()
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+            "queue_depth": self.handler.queue.qsize(),
+        }
+
+
+def setup_logging(level: str = None, log_format: str = None, sample_rates: str = None,
+                  payload_max_chars: int = None, queue_size: int = None) -> LoggingPipeline:
+    """Routes the root logger through a background-thread queue and returns the pipeline."""
+    level = level or os.getenv("MCP_LOG_LEVEL", "INFO")
+    log_format = log_format or os.getenv("MCP_LOG_FORMAT", "json")
+    sample_rates = sample_rates if sample_rates is not None else os.getenv("MCP_LOG_SAMPLE_RATES", "frame=0.01,heartbeat=0.01")
+    payload_max_chars = payload_max_chars or int(os.getenv("MCP_LOG_PAYLOAD_MAX_CHARS", "512"))
+    queue_size = queue_size or int(os.getenv("MCP_LOG_QUEUE_SIZE", "10000"))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "text":
+        stream_handler.setFormatter(TextFormatter(payload_max_chars))
+    else:
+        stream_handler.setFormatter(JsonFormatter(payload_max_chars))
+
+    sampler = SamplingFilter(parse_sample_rates(sample_rates))
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(sampler)
+    listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    listener.start()
+    return LoggingPipeline(handler, listener, sampler)
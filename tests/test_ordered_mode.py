@@ -0,0 +1,92 @@
+# tests/test_ordered_mode.py
+# Response ordering on '/mcp?order=ordered' when a waiting call is cancelled or times out.
+# Uses tools registered just for the test, so no ServiceNow instance is needed.
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("SERVICENOW_INSTANCE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SERVICENOW_USERNAME", "test")
+os.environ.setdefault("SERVICENOW_PASSWORD", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+
+async def sleep_tool(params, send_chunk):
+    await asyncio.sleep(params["sleep_s"])
+    return params["value"]
+
+
+async def stream_tool(params, send_chunk):
+    await send_chunk(params["value"])
+    return params["value"]
+
+
+# Module-scoped: the app's lifespan closes process-wide resources, so it runs once
+@pytest.fixture(scope="module")
+def client():
+    for name, handler in (("test_sleep", sleep_tool), ("test_stream", stream_tool)):
+        main.tool_registry.register({"name": name, "input_schema": {"type": "object"}}, handler)
+    try:
+        with TestClient(main.app) as client:
+            yield client
+    finally:
+        main.tool_registry.unregister("test_sleep")
+        main.tool_registry.unregister("test_stream")
+
+
+def execute(ws, message_id, tool_name, params, **extra):
+    ws.send_text(json.dumps({"id": message_id, "type": "execute", "tool_name": tool_name, "params": params, **extra}))
+
+
+def receive_until_heartbeat(ws, after_s):
+    """
+    Sends a heartbeat `after_s` seconds from now and returns every message received before
+    its ack (which is never ordered), so a response that never comes fails the test instead of hanging it.
+    """
+    time.sleep(after_s)
+    ws.send_text(json.dumps({"id": "hb", "type": "heartbeat"}))
+    messages = []
+    while True:
+        message = json.loads(ws.receive_text())
+        if message["type"] == "heartbeat_ack":
+            return messages
+        messages.append((time.monotonic(), message))
+
+
+def test_cancelling_a_waiting_call_keeps_later_responses_in_order(client):
+    with client.websocket_connect("/mcp?order=ordered") as ws:
+        ws.receive_text()  # session_id
+        started = time.monotonic()
+        execute(ws, "a", "test_sleep", {"sleep_s": 0.6, "value": "a"})
+        execute(ws, "b", "test_sleep", {"sleep_s": 0, "value": "b"})
+        execute(ws, "c", "test_sleep", {"sleep_s": 0, "value": "c"})
+        time.sleep(0.2)
+        # b has finished and is waiting for a's response to be sent
+        ws.send_text(json.dumps({"id": "x", "type": "cancel", "target_id": "b"}))
+        messages = receive_until_heartbeat(ws, 1.0)
+
+    ack = next(message for _, message in messages if message["type"] == "cancel_ack")
+    assert ack["cancelled"] is True
+    results = [(at - started, message["id"]) for at, message in messages if message["type"] == "tool_result"]
+    # c may not overtake a, which was still running when the call between them was cancelled
+    assert [message_id for _, message_id in results] == ["a", "c"]
+    assert results[0][0] >= 0.5
+
+
+def test_stream_timing_out_while_waiting_still_answers_in_order(client):
+    with client.websocket_connect("/mcp?order=ordered") as ws:
+        ws.receive_text()  # session_id
+        execute(ws, "a", "test_sleep", {"sleep_s": 0.6, "value": "a"})
+        # Times out while waiting for a before sending its first chunk
+        execute(ws, "b", "test_stream", {"value": "b"}, deadline_ms=200)
+        execute(ws, "c", "test_sleep", {"sleep_s": 0, "value": "c"})
+        responses = [message for _, message in receive_until_heartbeat(ws, 1.2)]
+
+    assert [r["id"] for r in responses] == ["a", "b", "c"]
+    assert responses[1]["type"] == "error" and responses[1]["error_type"] == "timeout"
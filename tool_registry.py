@@ -0,0 +1,281 @@
+# tool_registry.py
+# Table of the tools this server provides: each tool's definition (as served at /tools) and
+# its handler, with the definition's input_schema compiled once into a validator.
+# Dispatch is a dict lookup, and params are checked against the schema before the handler
+# runs, so an invalid call never reaches ServiceNow.
+#
+# The validator covers the JSON Schema keywords the tool definitions use: type, enum,
+# properties, required, additionalProperties, items, minItems/maxItems, minLength/maxLength,
+# minimum/maximum, oneOf and anyOf. Annotations (description, example, default) are ignored.
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+class UnknownToolError(Exception):
+    """Raised when an 'execute' message names a tool this server does not provide."""
+
+
+class ValidationError(ValueError):
+    """Raised when tool params do not match the tool's input_schema."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+        self.path = []  # Keys and indexes from the params root, filled in while unwinding
+
+    def __str__(self) -> str:
+        if not self.path:
+            return self.message
+        location = "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in self.path).lstrip(".")
+        return f"'{location}': {self.message}"
+
+
+def _check_all(checks: list):
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value):
+        for check in checks:
+            check(value)
+    return validate
+
+
+def compile_schema(schema: dict):
+    """
+    Compiles a JSON Schema into a function that raises ValidationError for an invalid value.
+    Each keyword becomes one small check, so validating a value does no schema lookups.
+    """
+    checks = []
+
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        type_checks = [_TYPE_CHECKS[t] for t in types]
+        expected = " or ".join(types)
+
+        def check_type(value):
+            for type_check in type_checks:
+                if type_check(value):
+                    return
+            raise ValidationError(f"expected {expected}, got {_json_type(value)}")
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value):
+            # Compare type too, so 1 does not match "1" or True
+            for option in allowed:
+                if value == option and type(value) is type(option):
+                    return
+            raise ValidationError(f"must be one of {allowed}")
+        checks.append(check_enum)
+
+    if "minimum" in schema or "maximum" in schema:
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+
+        def check_range(value):
+            if not _TYPE_CHECKS["number"](value):
+                return
+            if minimum is not None and value < minimum:
+                raise ValidationError(f"must be at least {minimum}")
+            if maximum is not None and value > maximum:
+                raise ValidationError(f"must be at most {maximum}")
+        checks.append(check_range)
+
+    if "minLength" in schema or "maxLength" in schema:
+        min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+
+        def check_length(value):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                raise ValidationError(f"must be at least {min_length} characters long")
+            if max_length is not None and len(value) > max_length:
+                raise ValidationError(f"must be at most {max_length} characters long")
+        checks.append(check_length)
+
+    if "minItems" in schema or "maxItems" in schema:
+        min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+
+        def check_size(value):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                raise ValidationError(f"must have at least {min_items} item(s)")
+            if max_items is not None and len(value) > max_items:
+                raise ValidationError(f"must have at most {max_items} item(s)")
+        checks.append(check_size)
+
+    if "items" in schema:
+        item_check = compile_schema(schema["items"])
+
+        def check_items(value):
+            if not isinstance(value, list):
+                return
+            for index, item in enumerate(value):
+                try:
+                    item_check(item)
+                except ValidationError as e:
+                    e.path.insert(0, index)
+                    raise
+        checks.append(check_items)
+
+    if schema.get("required"):
+        required = tuple(schema["required"])
+
+        def check_required(value):
+            if not isinstance(value, dict):
+                return
+            for key in required:
+                if key not in value:
+                    raise ValidationError(f"'{key}' is required")
+        checks.append(check_required)
+
+    if "properties" in schema or "additionalProperties" in schema:
+        property_checks = {key: compile_schema(sub) for key, sub in schema.get("properties", {}).items()}
+        additional = schema.get("additionalProperties", True)
+        additional_check = compile_schema(additional) if isinstance(additional, dict) else None
+
+        def check_properties(value):
+            if not isinstance(value, dict):
+                return
+            for key, item in value.items():
+                check = property_checks.get(key)
+                if check is None:
+                    if additional is False:
+                        raise ValidationError(f"unexpected property '{key}'")
+                    check = additional_check
+                    if check is None:
+                        continue
+                try:
+                    check(item)
+                except ValidationError as e:
+                    e.path.insert(0, key)
+                    raise
+        checks.append(check_properties)
+
+    if "anyOf" in schema:
+        any_of = [compile_schema(sub) for sub in schema["anyOf"]]
+
+        def check_any_of(value):
+            errors = []
+            for check in any_of:
+                try:
+                    check(value)
+                    return
+                except ValidationError as e:
+                    errors.append(str(e))
+            raise ValidationError(f"must match at least one of: {'; or '.join(errors)}")
+        checks.append(check_any_of)
+
+    if "oneOf" in schema:
+        one_of = [compile_schema(sub) for sub in schema["oneOf"]]
+
+        def check_one_of(value):
+            errors = []
+            for check in one_of:
+                try:
+                    check(value)
+                except ValidationError as e:
+                    errors.append(str(e))
+            matched = len(one_of) - len(errors)
+            if matched == 0:
+                raise ValidationError(f"must match exactly one of: {'; or '.join(errors)}")
+            if matched > 1:
+                raise ValidationError(f"must match exactly one alternative, matched {matched}")
+        checks.append(check_one_of)
+
+    if not checks:
+        return lambda value: None
+    return _check_all(checks)
+
+
+def _json_type(value) -> str:
+    for name in ("null", "boolean", "integer", "number", "string", "array", "object"):
+        if _TYPE_CHECKS[name](value):
+            return name
+    return type(value).__name__
+
+
+class Tool:
+    """One registered tool: its definition, compiled validator and handler."""
+
+    __slots__ = ("name", "definition", "handler", "streaming", "_validate")
+
+    def __init__(self, definition: dict, handler):
+        self.name = definition["name"]
+        self.definition = definition
+        self.handler = handler
+        self.streaming = bool(definition.get("streaming", False))
+        self._validate = compile_schema(definition.get("input_schema", {}))
+
+    def validate(self, params):
+        """Raises ValidationError unless `params` match the tool's input_schema."""
+        self._validate(params)
+
+    async def __call__(self, params: dict, send_chunk):
+        return await self.handler(params, send_chunk)
+
+
+class ToolRegistry:
+    """
+    Tools by name. Handlers are coroutines taking (params, send_chunk); streaming tools pass
+    partial results to `send_chunk` as they arrive.
+    """
+
+    def __init__(self):
+        self._tools = {}
+        self.version = 0  # Bumped on every change, so derived data (e.g. /tools) can be rebuilt
+
+    def register(self, definition: dict, handler) -> Tool:
+        """Adds a tool, compiling its input_schema now. Raises ValueError if the name is taken."""
+        if definition["name"] in self._tools:
+            raise ValueError(f"Tool '{definition['name']}' is already registered.")
+        tool = self._tools[definition["name"]] = Tool(definition, handler)
+        self.version += 1
+        return tool
+
+    def unregister(self, name: str):
+        if self._tools.pop(name, None) is not None:
+            self.version += 1
+
+    def get(self, name: str) -> Tool:
+        """The tool called `name`. Raises UnknownToolError if there is none."""
+        tool = self._tools.get(name) if isinstance(name, str) else None
+        if tool is None:
+            raise UnknownToolError(f"Unknown tool: '{name}'")
+        return tool
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def definitions(self) -> list:
+        """Tool definitions in registration order, as served at /tools."""
+        return [tool.definition for tool in self._tools.values()]
+
+    @classmethod
+    def from_definitions(cls, definitions: list, handlers: dict) -> "ToolRegistry":
+        """
+        Builds a registry pairing each definition with the handler of the same name.
+        Raises ValueError if a definition has no handler or a handler has no definition.
+        """
+        names = [definition["name"] for definition in definitions]
+        missing = [name for name in names if name not in handlers]
+        extra = [name for name in handlers if name not in names]
+        if missing or extra:
+            raise ValueError(f"Tool definitions and handlers do not match (no handler: {missing}, no definition: {extra}).")
+        registry = cls()
+        for definition in definitions:
+            registry.register(definition, handlers[definition["name"]])
+        return registry
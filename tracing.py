@@ -0,0 +1,273 @@
+# tracing.py
+# Lightweight span tracing with W3C trace context (traceparent) propagation.
+# Spans always carry ids, so the correlation id sent to ServiceNow exists even with tracing
+# off; only sampled spans are recorded and handed to the exporter, which writes them from a
+# background thread (JSON lines to a file, or OTLP/HTTP JSON to a collector).
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from codec import codec
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Span of the work running in the current task (or thread), if any
+current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value) -> tuple:
+    """Returns (trace_id, parent_span_id, sampled) from a traceparent string, or None if invalid."""
+    if not isinstance(value, str):
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+class Span:
+    """One timed operation. Attributes are only kept when the span is recorded."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "sampled", "recording",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: str, sampled: bool, start_ns: int = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.recording = sampled and tracer.exporter is not None
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = {} if self.recording else None
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        if self.recording:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        if self.recording:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self, end_ns: int = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.recording:
+            self.tracer.exporter.submit(self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate: float = 1.0, service_name: str = "servicenow-mcp"):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+
+    def start_span(self, name: str, parent: Span = None, traceparent: str = None, start_ns: int = None,
+                   attributes: dict = None) -> Span:
+        """
+        Starts a span that the caller must end(). The parent is, in order: `parent`, the remote
+        context in `traceparent` (e.g. from an agent's message), or the current span.
+        Without any of these, a new trace is started.
+        """
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if parent is None and remote is None:
+            parent = current_span.get()
+        if parent is not None:
+            span = Span(self, name, parent.trace_id, parent.span_id, parent.sampled, start_ns)
+        elif remote is not None:
+            trace_id, parent_id, sampled = remote
+            span = Span(self, name, trace_id, parent_id, sampled, start_ns)
+        else:
+            sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+            span = Span(self, name, f"{random.getrandbits(128):032x}", None, sampled, start_ns)
+        if attributes and span.recording:
+            span.attributes.update(attributes)
+        return span
+
+    @contextmanager
+    def use_span(self, span: Span):
+        """Makes `span` the current span (the default parent) inside the block, without ending it."""
+        token = current_span.set(span)
+        try:
+            yield span
+        finally:
+            current_span.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **kwargs):
+        """Runs the block in a new child span, recording any exception raised out of it."""
+        span = self.start_span(name, **kwargs)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+class BatchExporter:
+    """
+    Queues finished spans and exports them in batches from a background thread, so tracing
+    never blocks the caller. Spans are dropped when the queue is full.
+    """
+
+    _STOP = object()
+
+    def __init__(self, export_fn, queue_size: int = 10000, batch_size: int = 512, interval_s: float = 1.0):
+        self.export_fn = export_fn
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: dict):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = []
+            stop = False
+            deadline = time.monotonic() + self.interval_s
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self.export_fn(batch)
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.warning("Failed to export %d spans: %s", len(batch), e)
+            if stop:
+                return
+
+    def shutdown(self, timeout_s: float = 5.0):
+        """Exports what is queued and stops the thread."""
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=timeout_s)
+
+    def stats(self) -> dict:
+        return {"exported": self.exported, "dropped": self.dropped, "failed": self.failed,
+                "queue_depth": self._queue.qsize()}
+
+
+def jsonl_file_export(path: str):
+    """Export function appending one JSON span per line to `path`."""
+    def export(batch: list):
+        with open(path, "ab") as f:
+            f.write(b"".join(codec.dumps(span) + b"\n" for span in batch))
+    return export
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_http_export(endpoint: str, service_name: str, timeout_s: float = 5.0):
+    """Export function POSTing spans to an OpenTelemetry collector (OTLP/HTTP, JSON encoding)."""
+    def export(batch: list):
+        spans = []
+        for span in batch:
+            otlp_span = {
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in (span["attributes"] or {}).items()],
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            }
+            if span["parent_id"]:
+                otlp_span["parentSpanId"] = span["parent_id"]
+            spans.append(otlp_span)
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]}
+        request = urllib.request.Request(endpoint, data=codec.dumps(body), headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout_s) as response:
+            response.read()
+    return export
+
+
+def tracer_from_env() -> Tracer:
+    """
+    Builds the tracer from MCP_TRACE_EXPORTER: "none" (default; ids only, nothing recorded),
+    "file" (MCP_TRACE_FILE, JSON lines) or "otlp" (MCP_TRACE_OTLP_ENDPOINT).
+    """
+    exporter_name = os.getenv("MCP_TRACE_EXPORTER", "none")
+    service_name = os.getenv("MCP_TRACE_SERVICE_NAME", "servicenow-mcp")
+    sample_rate = float(os.getenv("MCP_TRACE_SAMPLE_RATE", "1.0"))
+    if exporter_name == "none":
+        return Tracer(None, sample_rate, service_name)
+    if exporter_name == "file":
+        export_fn = jsonl_file_export(os.getenv("MCP_TRACE_FILE", "traces.jsonl"))
+    elif exporter_name == "otlp":
+        export_fn = otlp_http_export(os.getenv("MCP_TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"), service_name)
+    else:
+        raise ValueError(f"Unknown trace exporter: '{exporter_name}'")
+    return Tracer(BatchExporter(export_fn), sample_rate, service_name)
+
+
+# Tracer shared by the server and the ServiceNow clients
+tracer = tracer_from_env()
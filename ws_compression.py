@@ -0,0 +1,126 @@
+# ws_compression.py
+# permessage-deflate (RFC 7692) for the /mcp socket, tuned for large incident payloads.
+# Messages smaller than a threshold are sent uncompressed (RSV1 clear), since deflate costs
+# more CPU than it saves on heartbeat acks and short errors; larger ones are compressed at a
+# configurable level, window size and context takeover.
+#
+# uvicorn only exposes an on/off switch for permessage-deflate, so the server must be started
+# with this module's protocol class: `uvicorn main:app --ws ws_compression:DeflateWebSocketProtocol`
+# (or `python main.py`, which does so).
+#
+# Environment:
+#   MCP_WS_DEFLATE                   "true" (default) or "false"
+#   MCP_WS_DEFLATE_MIN_SIZE          Messages below this many bytes are sent raw (default 512)
+#   MCP_WS_DEFLATE_LEVEL             zlib level 1-9 (default 6)
+#   MCP_WS_DEFLATE_MEM_LEVEL         zlib memLevel 1-9 (default 5)
+#   MCP_WS_DEFLATE_WINDOW_BITS       Server LZ77 window, 9-15 (default 12)
+#   MCP_WS_DEFLATE_CONTEXT_TAKEOVER  "true" (default) keeps the window between messages
+#                                    (better ratio, ~32 KB per session); "false" resets it
+import os
+import time
+
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CONT, CTRL_OPCODES
+
+from metrics import registry
+
+DEFLATE_FRAMES = registry.counter(
+    "mcp_ws_deflate_frames_total",
+    "Outbound WebSocket data frames on deflate-enabled sessions, by whether they were compressed.",
+    ("result",))
+DEFLATE_BYTES = registry.counter(
+    "mcp_ws_deflate_bytes_total",
+    "Payload bytes of compressed outbound frames before (in) and after (out) deflate; out/in is the ratio.",
+    ("stage",))
+DEFLATE_CPU_SECONDS = registry.counter(
+    "mcp_ws_deflate_cpu_seconds_total",
+    "Thread CPU time spent compressing outbound frames.")
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class DeflateSettings:
+    """permessage-deflate settings, from the environment unless given."""
+
+    def __init__(self, enabled: bool = None, min_size: int = None, level: int = None, mem_level: int = None,
+                 window_bits: int = None, context_takeover: bool = None):
+        self.enabled = _env_bool("MCP_WS_DEFLATE", "true") if enabled is None else enabled
+        self.min_size = int(os.getenv("MCP_WS_DEFLATE_MIN_SIZE", "512")) if min_size is None else min_size
+        self.level = int(os.getenv("MCP_WS_DEFLATE_LEVEL", "6")) if level is None else level
+        self.mem_level = int(os.getenv("MCP_WS_DEFLATE_MEM_LEVEL", "5")) if mem_level is None else mem_level
+        self.window_bits = int(os.getenv("MCP_WS_DEFLATE_WINDOW_BITS", "12")) if window_bits is None else window_bits
+        self.context_takeover = (_env_bool("MCP_WS_DEFLATE_CONTEXT_TAKEOVER", "true")
+                                 if context_takeover is None else context_takeover)
+
+    def factory(self) -> "ThresholdDeflateFactory":
+        return ThresholdDeflateFactory(
+            min_size=self.min_size,
+            server_no_context_takeover=not self.context_takeover,
+            server_max_window_bits=self.window_bits,
+            client_max_window_bits=self.window_bits,
+            compress_settings={"level": self.level, "memLevel": self.mem_level},
+        )
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """PerMessageDeflate that sends messages shorter than `min_size` uncompressed."""
+
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self._raw_message = False  # Whether the message being sent (incl. continuations) is raw
+
+    def encode(self, frame):
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is not CONT:
+            # A fragmented message's size is unknown from its first frame, so it is compressed
+            self._raw_message = frame.fin and len(frame.data) < self.min_size
+            if self._raw_message:
+                DEFLATE_FRAMES.inc("raw")
+        if self._raw_message:
+            # The compressor is not fed, so its context stays in step with the peer's decoder
+            return frame
+        started = time.thread_time()
+        encoded = super().encode(frame)
+        DEFLATE_CPU_SECONDS.inc(amount=time.thread_time() - started)
+        DEFLATE_FRAMES.inc("compressed")
+        DEFLATE_BYTES.inc("in", amount=len(frame.data))
+        DEFLATE_BYTES.inc("out", amount=len(encoded.data))
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate as usual, then applies the raw-below-`min_size` rule."""
+
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+class DeflateWebSocketProtocol(WebSocketsSansIOProtocol):
+    """uvicorn's websockets (sans-I/O) protocol with the configured permessage-deflate extension."""
+
+    settings = None  # DeflateSettings, read from the environment on first use
+
+    def __init__(self, config, server_state, app_state, _loop=None):
+        super().__init__(config, server_state, app_state, _loop)
+        cls = type(self)
+        if cls.settings is None:
+            cls.settings = DeflateSettings()
+        enabled = config.ws_per_message_deflate and cls.settings.enabled
+        self.conn.available_extensions = [cls.settings.factory()] if enabled else []